@@ -0,0 +1,63 @@
+import numpy as np
+
+def normalize(vecs):
+    v=np.asarray(vecs, dtype=np.float32)
+    return v/(np.linalg.norm(v, axis=-1, keepdims=True)+1e-12)
+
+def spherical_kmeans(X, k, iters=20, seed=0):
+    """k-means on unit vectors using cosine similarity; returns (k, dim) unit centroids."""
+    X=normalize(X); rng=np.random.default_rng(seed)
+    k=min(k, X.shape[0])
+    C=X[rng.choice(X.shape[0], k, replace=False)].copy()
+    for _ in range(iters):
+        a=np.argmax(X.dot(C.T), axis=1)
+        S=np.zeros_like(C); np.add.at(S, a, X)
+        empty=np.bincount(a, minlength=k)==0
+        if empty.any(): S[empty]=X[rng.choice(X.shape[0], int(empty.sum()), replace=False)]
+        C=normalize(S)
+    return C
+
+class IVFIndex:
+    """IVF-Flat index over row positions of a vector store.
+
+    Vectors are bucketed by their nearest k-means centroid; a query scans only the
+    ``nprobe`` closest buckets. Raising ``nprobe`` trades speed for recall
+    (``nprobe == nlist`` is an exact scan). The index only holds positions, the
+    caller keeps the vectors and does the exact scoring of the candidates.
+    """
+    def __init__(self, dim, nlist=64, nprobe=8, min_train=None, seed=0):
+        self.dim=dim; self.nlist=int(nlist); self.nprobe=int(nprobe); self.seed=seed
+        self.min_train=int(min_train) if min_train else 8*self.nlist
+        self.centroids=None; self.trained_on=0; self.reset()
+    @property
+    def is_trained(self): return self.centroids is not None
+    def reset(self):
+        self._lists=[np.zeros(0, dtype=np.int64) for _ in range(self.nlist)]; self._tails=[[] for _ in range(self.nlist)]
+    def train(self, X, sample=256):
+        X=np.asarray(X); n=X.shape[0]
+        if n>sample*self.nlist: X=X[np.random.default_rng(self.seed).choice(n, sample*self.nlist, replace=False)]
+        self.centroids=spherical_kmeans(X, self.nlist, seed=self.seed); self.nlist=self.centroids.shape[0]
+        self.trained_on=n; self.reset()
+    def assign(self, X):
+        return np.argmax(normalize(np.atleast_2d(X)).dot(self.centroids.T), axis=1).astype(np.int32)
+    def add(self, positions, lists):
+        for p, c in zip(np.atleast_1d(positions), np.atleast_1d(lists)): self._tails[int(c)].append(int(p))
+    def rebuild(self, lists):
+        """Rebuild the inverted lists from a per-position list assignment."""
+        lists=np.asarray(lists); order=np.argsort(lists, kind='stable')
+        bounds=np.searchsorted(lists[order], np.arange(self.nlist+1))
+        self._lists=[order[bounds[c]:bounds[c+1]].astype(np.int64) for c in range(self.nlist)]; self._tails=[[] for _ in range(self.nlist)]
+    def _list(self, c):
+        if self._tails[c]:
+            self._lists[c]=np.concatenate([self._lists[c], np.asarray(self._tails[c], dtype=np.int64)]); self._tails[c]=[]
+        return self._lists[c]
+    def candidates(self, q, nprobe=None):
+        """Positions in the ``nprobe`` lists closest to the unit query ``q``."""
+        nprobe=min(int(nprobe or self.nprobe), self.nlist)
+        cs=self.centroids.dot(q)
+        probe=np.argpartition(-cs, nprobe-1)[:nprobe] if nprobe<self.nlist else np.arange(self.nlist)
+        return np.concatenate([self._list(int(c)) for c in probe])
+    def save(self, path):
+        np.save(path, self.centroids)
+    def load(self, path):
+        self.centroids=np.load(path).astype(np.float32); self.nlist=self.centroids.shape[0]; self.reset()
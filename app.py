@@ -30,22 +30,39 @@ st.markdown(
 )
 
 # ---------------- API helpers ----------------
-def api_get(path):
-    url = backend_url.rstrip("/") + path
-    r = requests.get(url)
+API_CACHE_TTL = int(os.getenv("API_CACHE_TTL", "15"))  # seconds
+PAGE_SIZE = 20
+
+@st.cache_resource
+def get_session():
+    # one keep-alive connection pool shared by every rerun and user session
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_data(ttl=API_CACHE_TTL, show_spinner=False)
+def _cached_get(url, params=None):
+    r = get_session().get(url, params=params)
     r.raise_for_status()
     return r.json()
 
+def api_get(path, params=None):
+    return _cached_get(backend_url.rstrip("/") + path, params)
+
 def api_post(path, data=None):
     url = backend_url.rstrip("/") + path
-    r = requests.post(url, data=data)
+    r = get_session().post(url, data=data)
     r.raise_for_status()
+    _cached_get.clear()  # writes change jobs/evaluations
     return r.json()
 
 def api_post_file(path, files=None, data=None):
     url = backend_url.rstrip("/") + path
-    r = requests.post(url, files=files, data=data)
+    r = get_session().post(url, files=files, data=data)
     r.raise_for_status()
+    _cached_get.clear()
     return r.json()
 
 # ---------------- Student view ----------------
@@ -180,25 +197,37 @@ else:
         min_score = st.slider("Min score", 0, 100, 0)
         location_filter = st.text_input("Filter by candidate location (substring)", value="")
 
+        # filtering happens in the backend; only the current page is fetched and rendered.
+        # cursors of the pages visited so far, reset whenever the job or filters change
+        view = (job_id, min_score, location_filter)
+        if st.session_state.get("eval_view") != view:
+            st.session_state["eval_view"] = view
+            st.session_state["eval_cursors"] = [None]
+        cursors = st.session_state["eval_cursors"]
+        params = {"min_score": min_score, "location": location_filter or None, "include_details": True, "limit": PAGE_SIZE}
+        if cursors[-1]:
+            params["cursor"] = cursors[-1]
         try:
-            evals = api_get(f"/evaluations/{job_id}")
+            page = api_get(f"/evaluations/{job_id}", params=params)
         except Exception as e:
             st.error(f"Failed to get evaluations: {e}")
-            evals = []
-
-        # apply filters
-        filtered = []
-        for e in evals:
-            try:
-                if float(e.get('score', 0) or 0) < min_score:
-                    continue
-                if location_filter and location_filter.lower() not in (e.get('candidate_location') or "").lower():
-                    continue
-                filtered.append(e)
-            except Exception:
-                continue
-
-        st.write(f"{len(filtered)} candidates found (after filters)")
+            page = {}
+        filtered = page.get("items", [])
+        next_cursor = page.get("next_cursor")
+
+        first = (len(cursors) - 1) * PAGE_SIZE
+        if filtered:
+            st.write(f"Showing candidates {first + 1}–{first + len(filtered)} (after filters)")
+        else:
+            st.write("0 candidates found (after filters)")
+
+        prev_col, next_col = st.columns(2)
+        if prev_col.button("Previous page", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        if next_col.button("Next page", disabled=not next_cursor):
+            cursors.append(next_cursor)
+            st.rerun()
 
         if len(filtered):
             for e in filtered:
@@ -249,27 +278,12 @@ else:
                     else:
                         st.write("No feedback available.")
 
-            # export CSV button
+            # export CSV button — the backend streams the CSV with the same filters
             if st.button("Export current view to CSV"):
                 try:
-                    import pandas as pd, io
-                    rows = []
-                    for e in filtered:
-                        d = {}
-                        try:
-                            d = json.loads(e.get('details') or "{}")
-                        except:
-                            d = {}
-                        rows.append({
-                            "candidate_name": e.get('candidate_name'),
-                            "email": e.get('candidate_email'),
-                            "location": e.get('candidate_location'),
-                            "score": e.get('score'),
-                            "verdict": e.get('verdict'),
-                            "missing": ",".join(d.get('missing_skills', []))
-                        })
-                    df = pd.DataFrame(rows)
-                    csv = df.to_csv(index=False).encode('utf-8')
-                    st.download_button(label="Download CSV", data=csv, file_name=f"evaluations_job_{job_id}.csv")
+                    r = get_session().get(backend_url.rstrip("/") + f"/evaluations/{job_id}/export.csv",
+                                          params={"min_score": min_score, "location": location_filter or None})
+                    r.raise_for_status()
+                    st.download_button(label="Download CSV", data=r.content, file_name=f"evaluations_job_{job_id}.csv")
                 except Exception as ex:
                     st.error(f"Export failed: {ex}")
\ No newline at end of file
@@ -0,0 +1,49 @@
+import threading, queue, time, collections, logging
+from concurrent.futures import Future
+import numpy as np
+logger = logging.getLogger(__name__)
+
+class EmbeddingBatcher:
+    """Micro-batches embedding requests from concurrent request handlers.
+
+    Callers block on ``embed``/``embed_many`` while a single worker thread
+    collects pending texts for up to ``max_wait_ms`` (or until ``max_batch``
+    texts are queued) and encodes them with one ``encode_fn`` call.
+    """
+    def __init__(self, encode_fn, max_batch=32, max_wait_ms=5.0):
+        self.encode_fn=encode_fn; self.max_batch=max(1,int(max_batch)); self.max_wait=max(0.0,float(max_wait_ms))/1000.0
+        self._q=queue.Queue(); self._lock=threading.Lock(); self._thread=None
+        self.batch_sizes=collections.Counter(); self.batches=0; self.items=0
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread=threading.Thread(target=self._run, name='embedding-batcher', daemon=True); self._thread.start()
+    def submit(self, texts):
+        self._ensure_worker(); futs=[]
+        for t in texts:
+            f=Future(); self._q.put((t, f)); futs.append(f)
+        return futs
+    def embed(self, text, timeout=None):
+        return self.submit([text])[0].result(timeout)
+    def embed_many(self, texts, timeout=None):
+        return np.vstack([f.result(timeout) for f in self.submit(texts)])
+    def _run(self):
+        while True:
+            batch=[self._q.get()]; deadline=time.monotonic()+self.max_wait
+            while len(batch)<self.max_batch:
+                remaining=deadline-time.monotonic()
+                try: batch.append(self._q.get(timeout=remaining) if remaining>0 else self._q.get_nowait())
+                except queue.Empty: break
+            try:
+                vecs=self.encode_fn([t for t,_ in batch])
+                for (_, f), v in zip(batch, vecs): f.set_result(v)
+            except Exception as ex:
+                logger.exception("embedding batch failed")
+                for _, f in batch: f.set_exception(ex)
+            with self._lock:
+                self.batches+=1; self.items+=len(batch); self.batch_sizes[len(batch)]+=1
+    def stats(self):
+        with self._lock:
+            return {'batches': self.batches, 'items': self.items, 'mean_batch_size': self.items/self.batches if self.batches else 0.0,
+                    'max_batch': self.max_batch, 'max_wait_ms': self.max_wait*1000.0, 'queued': self._q.qsize(),
+                    'batch_size_distribution': {str(k): v for k, v in sorted(self.batch_sizes.items())}}
@@ -0,0 +1,53 @@
+import os, time, logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from backend.scoring import score_task, split_chunks
+from backend.db import add_evaluations
+from backend.workers import Lazy, mp_context, ndjson, chunked, pipelined
+logger = logging.getLogger(__name__)
+BULK_WORKERS = int(os.getenv('BULK_WORKERS', '0')) or None  # None -> one per CPU
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', '64'))
+_POOL = Lazy(lambda: ProcessPoolExecutor(max_workers=BULK_WORKERS, mp_context=mp_context()))
+def get_pool(): return _POOL.get()
+def shutdown(): _POOL.close(lambda p: p.shutdown(wait=False, cancel_futures=True))
+def stream_evaluations(tasks, embed_fn, on_scored=None, include_details=False, chunk_size=BULK_CHUNK_SIZE):
+    """Score (resume_row, job_row, profile) tasks on the process pool and yield NDJSON lines.
+
+    Resumes (whole text plus section chunks) are embedded per chunk of tasks
+    with one ``embed_fn`` call in the parent, so workers
+    only do the CPU-bound matching. The next chunk is scored while the previous
+    one is written to the database in a single transaction. ``on_scored`` is
+    called with (resume_row, job_row, resume_embedding) for every stored result.
+    """
+    total = len(tasks); done = 0; t0 = time.time(); pool = get_pool()
+    yield ndjson({"event": "start", "total": total})
+    def submit(chunk):
+        texts = [[r['raw_text'] or ''] + split_chunks(r['raw_text']) for r, _, _ in chunk]
+        flat = embed_fn([t for ts in texts for t in ts]); ends = np.cumsum([len(ts) for ts in texts])
+        embs = [flat[e - len(ts)] for ts, e in zip(texts, ends)]
+        futs = [pool.submit(score_task, (i, texts[i][0], j['jd_text'], p, flat[e - len(texts[i]) + 1:e]))
+                for i, ((r, j, p), e) in enumerate(zip(chunk, ends))]
+        return chunk, embs, futs
+    def drain(chunk, embs, futs):
+        nonlocal done
+        rows = []; scored = []; lines = []
+        for (r, j, p), emb, f in zip(chunk, embs, futs):
+            try:
+                _, score, verdict, details = f.result()
+            except Exception as ex:
+                logger.exception("bulk scoring failed")
+                lines.append({"event": "error", "resume_id": r['id'], "job_id": j['id'], "error": str(ex)}); continue
+            rows.append((r['id'], j['id'], score, verdict, details, p['jd_hash'])); scored.append((r, j, emb, score, verdict, details))
+        ids = add_evaluations(rows)
+        for eid, (r, j, emb, score, verdict, details) in zip(ids, scored):
+            if on_scored:
+                try: on_scored(r, j, emb)
+                except Exception as ex: logger.warning("bulk on_scored failed: %s", ex)
+            out = {"event": "result", "evaluation_id": eid, "resume_id": r['id'], "job_id": j['id'], "score": score, "verdict": verdict}
+            if include_details: out["details"] = details
+            lines.append(out)
+        done += len(chunk)
+        lines.append({"event": "progress", "done": done, "total": total})
+        return "".join(ndjson(l) for l in lines)
+    yield from pipelined(chunked(tasks, max(1, chunk_size)), submit, lambda p: drain(*p))
+    yield ndjson({"event": "done", "total": total, "elapsed_s": round(time.time() - t0, 3)})
@@ -1,26 +1,81 @@
-import sqlite3, os, json
-DB_PATH = os.path.join(os.path.dirname(__file__), "data.db")
-def get_conn():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
-def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute('''CREATE TABLE IF NOT EXISTS jobs (
+import sqlite3, os, re, json, queue, hashlib, threading
+from contextlib import contextmanager
+from backend.workers import Lazy
+DB_PATH = os.getenv("JOBSYNC_DB_PATH", os.path.join(os.path.dirname(__file__), "data.db"))
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+POOL_TIMEOUT_S = float(os.getenv("DB_POOL_TIMEOUT_S", "30"))
+class PoolTimeout(Exception):
+    pass
+class ConnectionPool:
+    """Thread-safe pool of autocommit SQLite connections.
+
+    Connections are opened lazily up to ``size`` and handed to one thread at a
+    time. Every connection runs in WAL mode with ``synchronous=NORMAL``, so
+    readers never block the writer. Use ``transaction()`` for writes. Waiting
+    longer than ``timeout`` seconds for a free connection raises PoolTimeout.
+    """
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT_S):
+        self.path = path; self.size = max(1, int(size)); self.timeout = timeout; self.pid = os.getpid()
+        self._idle = queue.LifoQueue(); self._opened = 0; self._lock = threading.Lock()
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL"); conn.execute("PRAGMA synchronous=NORMAL"); conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+    @contextmanager
+    def connection(self):
+        conn = None
+        try: conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._opened < self.size: self._opened += 1; conn = self._connect()
+            if conn is None:
+                try: conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty: raise PoolTimeout(f"no database connection free after {self.timeout:g}s ({self.size} in use)") from None
+        try: yield conn
+        finally:
+            if conn.in_transaction: conn.execute("ROLLBACK")
+            self._idle.put(conn)
+    @contextmanager
+    def transaction(self, immediate=False):
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK"); raise
+            conn.execute("COMMIT")
+    def close(self):
+        while True:
+            try: self._idle.get_nowait().close()
+            except queue.Empty: break
+        self._opened = 0
+# a forked child must not reuse the parent's connections
+_POOL = Lazy(lambda: ConnectionPool(DB_PATH), stale=lambda p: p.pid != os.getpid() or p.path != DB_PATH)
+def get_pool(): return _POOL.get()
+def _read(sql, params=(), one=False):
+    with get_pool().connection() as conn:
+        cur = conn.execute(sql, params)
+        return cur.fetchone() if one else cur.fetchall()
+def _add_missing_columns(conn, table, columns):
+    have = {r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+    for name, decl in columns.items():
+        if name not in have: conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+def _m1_base_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         title TEXT,
         jd_text TEXT,
         location TEXT
     )''')
-    cur.execute('''CREATE TABLE IF NOT EXISTS resumes (
+    conn.execute('''CREATE TABLE IF NOT EXISTS resumes (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         name TEXT,
         email TEXT,
         location TEXT,
         raw_text TEXT
     )''')
-    cur.execute('''CREATE TABLE IF NOT EXISTS evaluations (
+    conn.execute('''CREATE TABLE IF NOT EXISTS evaluations (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         resume_id INTEGER,
         job_id INTEGER,
@@ -29,30 +84,286 @@ def init_db():
         details TEXT,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )''')
-    conn.commit()
-    conn.close()
+def _m2_tasks(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT,
+        payload TEXT,
+        status TEXT DEFAULT 'queued',
+        priority INTEGER DEFAULT 0,
+        attempts INTEGER DEFAULT 0,
+        max_attempts INTEGER DEFAULT 3,
+        run_after REAL DEFAULT 0,
+        result TEXT,
+        error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_queue ON tasks(status, priority DESC, id)")
+def _m3_job_profiles(conn):
+    _add_missing_columns(conn, 'jobs', {'jd_hash': 'TEXT', 'profile': 'TEXT'})
+def _m4_evaluation_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_evaluations_job_score ON evaluations(job_id, score DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_evaluations_resume ON evaluations(resume_id)")
+def _m5_text_cache(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS text_cache (
+        sha256 TEXT PRIMARY KEY,
+        text TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+def _m6_resume_fts(conn):
+    # external-content FTS5 index: the text lives only in resumes, the triggers keep the index in step;
+    # '+' and '#' are word characters so c++ and c# stay searchable
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS resumes_fts USING fts5(
+        name, location, raw_text, content='resumes', content_rowid='id', tokenize="unicode61 tokenchars '+#'"
+    )''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS resumes_fts_ai AFTER INSERT ON resumes BEGIN
+        INSERT INTO resumes_fts(rowid, name, location, raw_text) VALUES (new.id, new.name, new.location, new.raw_text);
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS resumes_fts_ad AFTER DELETE ON resumes BEGIN
+        INSERT INTO resumes_fts(resumes_fts, rowid, name, location, raw_text) VALUES ('delete', old.id, old.name, old.location, old.raw_text);
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS resumes_fts_au AFTER UPDATE ON resumes BEGIN
+        INSERT INTO resumes_fts(resumes_fts, rowid, name, location, raw_text) VALUES ('delete', old.id, old.name, old.location, old.raw_text);
+        INSERT INTO resumes_fts(rowid, name, location, raw_text) VALUES (new.id, new.name, new.location, new.raw_text);
+    END''')
+    conn.execute("INSERT INTO resumes_fts(resumes_fts) VALUES ('rebuild')")  # index the rows that already exist
+def skills_key(skills): return hashlib.sha256(json.dumps(skills).encode('utf-8')).hexdigest()[:16]
+def _score_columns(details):
+    """(hard_score, semantic_score, skills_hash, matched_bits, skills) of an evaluation's details.
+    matched_bits has bit i set when the i-th skill of the sorted skill list (stored once in
+    skill_lists under skills_hash) matched; None when the details predate hard_matches."""
+    b = details.get('breakdown') or {}; matched = details.get('hard_matches'); missing = details.get('missing_skills')
+    if matched is None or missing is None: return b.get('hard_score'), b.get('semantic_score'), None, None, None
+    skills = sorted(set(matched) | set(missing)); hit = set(matched)
+    bits = sum(1 << i for i, sk in enumerate(skills) if sk in hit).to_bytes((len(skills) + 7) // 8, 'little')
+    return b.get('hard_score'), b.get('semantic_score'), skills_key(skills), bits, skills
+def _add_skill_lists(conn, lists):
+    conn.executemany("INSERT OR IGNORE INTO skill_lists (hash, skills) VALUES (?,?)", [(skills_key(sk), json.dumps(sk)) for sk in lists])
+def _m7_score_components(conn):
+    # score components as columns so /rescore never has to re-run the pipeline; backfilled from details
+    _add_missing_columns(conn, 'evaluations', {'hard_score': 'REAL', 'semantic_score': 'REAL', 'skills_hash': 'TEXT', 'matched_bits': 'BLOB'})
+    conn.execute("CREATE TABLE IF NOT EXISTS skill_lists (hash TEXT PRIMARY KEY, skills TEXT)")
+    updates = []; lists = {}
+    for r in conn.execute("SELECT id, details FROM evaluations WHERE skills_hash IS NULL").fetchall():
+        try: details = json.loads(r['details'] or '{}')
+        except ValueError: continue
+        hard, sem, key, bits, skills = _score_columns(details)
+        if key: lists[key] = skills
+        updates.append((hard, sem, key, bits, r['id']))
+    _add_skill_lists(conn, lists.values())
+    conn.executemany("UPDATE evaluations SET hard_score=?, semantic_score=?, skills_hash=?, matched_bits=? WHERE id=?", updates)
+def _m8_resume_content_hash(conn):
+    # SHA-256 of the uploaded file: bulk ingest skips files it has seen.
+    # Rows from before this migration have none, the file bytes were never kept.
+    _add_missing_columns(conn, 'resumes', {'content_hash': 'TEXT'})
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_resumes_content_hash ON resumes(content_hash)")
+def _m9_task_leases(conn):
+    # a claimed task belongs to one worker process until lease_until; only expired leases are re-queued
+    _add_missing_columns(conn, 'tasks', {'owner': 'TEXT', 'lease_until': 'REAL'})
+def _m10_evaluation_jd_hash(conn):
+    # the JD text an evaluation was scored against: /rescore must not mix its semantic score with
+    # an edited JD's skills. NULL for older rows, which cannot be told apart from stale ones
+    _add_missing_columns(conn, 'evaluations', {'jd_hash': 'TEXT'})
+# Applied in order; PRAGMA user_version records how many have run. Only ever append,
+# and keep each step idempotent: databases created before versioning already have some of them.
+MIGRATIONS = [_m1_base_tables, _m2_tasks, _m3_job_profiles, _m4_evaluation_indexes, _m5_text_cache, _m6_resume_fts, _m7_score_components, _m8_resume_content_hash, _m9_task_leases, _m10_evaluation_jd_hash]
+def migrate():
+    with get_pool().transaction(immediate=True) as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for i, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            step(conn); conn.execute(f"PRAGMA user_version={i}")
+        return len(MIGRATIONS)
+def init_db(): return migrate()
 def add_job(title, jd_text, location=""):
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("INSERT INTO jobs (title,jd_text,location) VALUES (?,?,?)", (title, jd_text, location))
-    conn.commit(); cid = cur.lastrowid; conn.close(); return cid
+    with get_pool().transaction() as conn:
+        return conn.execute("INSERT INTO jobs (title,jd_text,location) VALUES (?,?,?)", (title, jd_text, location)).lastrowid
 def get_jobs():
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("SELECT * FROM jobs ORDER BY id DESC")
-    rows = cur.fetchall(); conn.close(); return rows
-def add_resume(name, email, location, raw_text):
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("INSERT INTO resumes (name,email,location,raw_text) VALUES (?,?,?,?)", (name,email,location,raw_text))
-    conn.commit(); rid = cur.lastrowid; conn.close(); return rid
-def add_evaluation(resume_id, job_id, score, verdict, details_dict):
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("INSERT INTO evaluations (resume_id,job_id,score,verdict,details) VALUES (?,?,?,?,?)",
-                (resume_id, job_id, score, verdict, json.dumps(details_dict)))
-    conn.commit(); eid = cur.lastrowid; conn.close(); return eid
-def get_evaluations_for_job(job_id):
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("SELECT e.*, r.name as candidate_name, r.email as candidate_email, r.location as candidate_location FROM evaluations e JOIN resumes r ON r.id=e.resume_id WHERE e.job_id=? ORDER BY e.score DESC", (job_id,))
-    rows = cur.fetchall(); conn.close(); return rows
+    return _read("SELECT id, title, jd_text, location, jd_hash FROM jobs ORDER BY id DESC")
+def get_job(job_id):
+    return _read("SELECT id, title, jd_text, location, jd_hash FROM jobs WHERE id=?", (job_id,), one=True)
+def update_job(job_id, title=None, jd_text=None, location=None):
+    """Update the given fields; a new JD text drops the compiled profile."""
+    with get_pool().transaction() as conn:
+        n = conn.execute("UPDATE jobs SET title=COALESCE(?,title), location=COALESCE(?,location) WHERE id=?", (title, location, job_id)).rowcount
+        if jd_text is not None: conn.execute("UPDATE jobs SET jd_text=?, jd_hash=NULL, profile=NULL WHERE id=?", (jd_text, job_id))
+        return n
+def get_job_profile(job_id):
+    r = _read("SELECT profile FROM jobs WHERE id=?", (job_id,), one=True)
+    return r['profile'] if r else None
+def set_job_profile(job_id, jd_hash, profile_json):
+    with get_pool().transaction() as conn:
+        conn.execute("UPDATE jobs SET jd_hash=?, profile=? WHERE id=?", (jd_hash, profile_json, job_id))
+def add_resume(name, email, location, raw_text, content_hash=None):
+    with get_pool().transaction() as conn:
+        return conn.execute("INSERT INTO resumes (name,email,location,raw_text,content_hash) VALUES (?,?,?,?,?)", (name,email,location,raw_text,content_hash)).lastrowid
+def _insert_many(conn, sql, rows):
+    # ids of an AUTOINCREMENT table are consecutive within one write transaction
+    rows = list(rows)
+    if not rows: return []
+    conn.executemany(sql, rows)
+    last = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    return list(range(last - len(rows) + 1, last + 1))
+def add_resumes(rows):
+    """Insert (name, email, location, raw_text) rows in one transaction; returns their ids."""
+    with get_pool().transaction(immediate=True) as conn:
+        return _insert_many(conn, "INSERT INTO resumes (name,email,location,raw_text) VALUES (?,?,?,?)", rows)
+def _ids_by_hash(conn, hashes):
+    hashes = list(hashes); out = {}
+    for i in range(0, len(hashes), 500):  # stay under SQLite's bound-parameter limit
+        part = hashes[i:i + 500]
+        out.update(conn.execute(f"SELECT content_hash, MIN(id) FROM resumes WHERE content_hash IN ({','.join('?' * len(part))}) GROUP BY content_hash", part).fetchall())
+    return out
+def get_resume_ids_by_hash(hashes):
+    """content_hash -> id of the first resume stored with it, for the hashes that are stored."""
+    with get_pool().connection() as conn: return _ids_by_hash(conn, hashes)
+def add_resume_files(rows):
+    """Insert (name, email, location, raw_text, content_hash) rows with distinct hashes in one
+    transaction, skipping hashes already stored (by a concurrent upload, say). Returns
+    (resume_id, added) per row; resume_id is the stored row's when added is False."""
+    with get_pool().transaction(immediate=True) as conn:
+        known = _ids_by_hash(conn, [r[4] for r in rows]); new = [r for r in rows if r[4] not in known]
+        ids = dict(zip([r[4] for r in new], _insert_many(conn, "INSERT INTO resumes (name,email,location,raw_text,content_hash) VALUES (?,?,?,?,?)", new)))
+        return [(known[r[4]], False) if r[4] in known else (ids[r[4]], True) for r in rows]
+_INSERT_EVALUATION = ("INSERT INTO evaluations (resume_id,job_id,score,verdict,details,hard_score,semantic_score,skills_hash,matched_bits,jd_hash) "
+                      "VALUES (?,?,?,?,?,?,?,?,?,?)")
+def _evaluation_rows(conn, rows):
+    out = []; lists = {}
+    for r, j, s, v, d, h in rows:
+        hard, sem, key, bits, skills = _score_columns(d)
+        if key: lists[key] = skills
+        out.append((r, j, s, v, json.dumps(d), hard, sem, key, bits, h))
+    _add_skill_lists(conn, lists.values()); return out
+def add_evaluation(resume_id, job_id, score, verdict, details_dict, jd_hash=None):
+    with get_pool().transaction() as conn:
+        return conn.execute(_INSERT_EVALUATION, _evaluation_rows(conn, [(resume_id, job_id, score, verdict, details_dict, jd_hash)])[0]).lastrowid
+def add_evaluations(rows):
+    """Insert (resume_id, job_id, score, verdict, details_dict, jd_hash) rows in one transaction; returns their ids."""
+    with get_pool().transaction(immediate=True) as conn:
+        return _insert_many(conn, _INSERT_EVALUATION, _evaluation_rows(conn, rows))
+def update_evaluation_details(evaluation_id, details_dict):
+    with get_pool().transaction() as conn:
+        conn.execute("UPDATE evaluations SET details=? WHERE id=?", (json.dumps(details_dict), evaluation_id))
+def get_evaluation(evaluation_id):
+    return _read("SELECT * FROM evaluations WHERE id=?", (evaluation_id,), one=True)
+_EVAL_COLUMNS = "e.id, e.resume_id, e.job_id, e.score, e.verdict, e.created_at, r.name as candidate_name, r.email as candidate_email, r.location as candidate_location"
+def _evaluation_query(job_id, min_score=None, location=None, verdict=None, after=None, include_details=False):
+    sql = f"SELECT {_EVAL_COLUMNS}{', e.details' if include_details else ''} FROM evaluations e JOIN resumes r ON r.id=e.resume_id WHERE e.job_id=?"
+    params = [job_id]
+    if min_score is not None: sql += " AND e.score>=?"; params.append(min_score)
+    if location:
+        sql += " AND r.location LIKE ? ESCAPE '\\'"
+        params.append('%' + location.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+    if verdict: sql += " AND e.verdict=?"; params.append(verdict)
+    # keyset: rows strictly after (score, id) in (score DESC, id ASC) order, which the
+    # (job_id, score DESC) index already yields since it carries the rowid
+    if after is not None: sql += " AND (e.score<? OR (e.score=? AND e.id>?))"; params += [after[0], after[0], after[1]]
+    return sql + " ORDER BY e.score DESC, e.id", params
+def query_evaluations(job_id, min_score=None, location=None, verdict=None, limit=None, after=None, include_details=False):
+    """Evaluations for a job, best first, filtered in SQL. ``after`` is the (score, id)
+    of the last row of the previous page; ``location`` is a case-insensitive substring."""
+    sql, params = _evaluation_query(job_id, min_score, location, verdict, after, include_details)
+    if limit is not None: sql += " LIMIT ?"; params.append(limit)
+    return _read(sql, params)
+def iter_evaluations(job_id, min_score=None, location=None, verdict=None, include_details=False, batch_size=500):
+    """Like query_evaluations, but yields rows a keyset page at a time instead of building a
+    list. Each page checks a connection out and back in, so a slow consumer holds none."""
+    after = None
+    while True:
+        rows = query_evaluations(job_id, min_score, location, verdict, batch_size, after, include_details)
+        yield from rows
+        if len(rows) < batch_size: break
+        after = (rows[-1]['score'], rows[-1]['id'])
+def get_score_components(job_id):
+    return _read("SELECT id, resume_id, score, verdict, hard_score, semantic_score, skills_hash, matched_bits, jd_hash FROM evaluations WHERE job_id=? ORDER BY id", (job_id,))
+def get_skill_lists(hashes):
+    hashes = list(hashes)
+    if not hashes: return {}
+    return {r['hash']: json.loads(r['skills']) for r in _read(f"SELECT hash, skills FROM skill_lists WHERE hash IN ({','.join('?' * len(hashes))})", hashes)}
+def _rows_by_id(sql, ids):
+    ids = list(ids); out = {}
+    for i in range(0, len(ids), 500):  # stay under SQLite's bound-parameter limit
+        part = ids[i:i + 500]
+        for r in _read(sql.format(','.join('?' * len(part))), part): out[r['id']] = r
+    return out
+def update_scores(rows, skills=None, details=()):
+    """Rescore write-back in one transaction: (score, verdict, hard_score, skills_hash,
+    matched_bits, id) rows, the sorted skill list they now refer to, and (details_dict, id)
+    rows for evaluations whose matched skills changed."""
+    with get_pool().transaction(immediate=True) as conn:
+        if skills is not None: _add_skill_lists(conn, [skills])
+        conn.executemany("UPDATE evaluations SET score=?, verdict=?, hard_score=?, skills_hash=?, matched_bits=? WHERE id=?", rows)
+        conn.executemany("UPDATE evaluations SET details=? WHERE id=?", [(json.dumps(d), i) for d, i in details])
+def get_cached_text(sha256):
+    r = _read("SELECT text FROM text_cache WHERE sha256=?", (sha256,), one=True)
+    return r['text'] if r else None
+def put_cached_text(sha256, text):
+    with get_pool().transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO text_cache (sha256,text) VALUES (?,?)", (sha256, text))
 def get_resume(resume_id):
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("SELECT * FROM resumes WHERE id=?", (resume_id,))
-    r = cur.fetchone(); conn.close(); return r
+    return _read("SELECT * FROM resumes WHERE id=?", (resume_id,), one=True)
+def get_resumes():
+    return _read("SELECT * FROM resumes ORDER BY id")
+def get_evaluated_resume_ids(job_id):
+    return [r[0] for r in _read("SELECT DISTINCT resume_id FROM evaluations WHERE job_id=?", (job_id,))]
+def get_resume_summaries(ids):
+    """id -> row (id, name, email, location) for the given resume ids, without the text."""
+    return _rows_by_id("SELECT id, name, email, location FROM resumes WHERE id IN ({})", ids)
+def get_resume_texts(ids): return {i: r['raw_text'] for i, r in _rows_by_id("SELECT id, raw_text FROM resumes WHERE id IN ({})", ids).items()}
+def get_evaluation_details(ids): return {i: json.loads(r['details'] or '{}') for i, r in _rows_by_id("SELECT id, details FROM evaluations WHERE id IN ({})", ids).items()}
+_FTS_TERM = re.compile(r'"([^"]*)"|(\S+)')
+def fts_query(text, match_all=True):
+    """An FTS5 MATCH expression for free text: every word, or "quoted phrase", becomes a
+    quoted string (so operators and punctuation in it are literal), joined by AND or OR.
+    None when there is nothing to search for."""
+    terms = [(a or b).strip() for a, b in _FTS_TERM.findall(text or '')]
+    terms = ['"%s"' % t.replace('"', '""') for t in terms if re.search(r'\w', t)]
+    return (' AND ' if match_all else ' OR ').join(terms) or None
+def search_resumes(match, limit=1000, location=None):
+    """Resumes matching the FTS5 expression ``match``, best BM25 first: rows of (id, bm25),
+    where bm25 is SQLite's (more negative is better)."""
+    sql = "SELECT rowid AS id, rank AS bm25 FROM resumes_fts WHERE resumes_fts MATCH ?"; params = [match]
+    if location: sql += " AND rowid IN (SELECT id FROM resumes WHERE location=?)"; params.append(location)
+    return _read(sql + " ORDER BY rank LIMIT ?", params + [limit])
+def resume_snippets(match, ids):
+    """id -> resume text excerpt with the terms of ``match`` in [brackets]. Snippets cost more
+    than the search itself, so ask only for the rows that are shown."""
+    ids = list(ids)
+    if not ids: return {}
+    rows = _read(f"SELECT rowid AS id, snippet(resumes_fts, 2, '[', ']', '...', 12) AS snippet FROM resumes_fts "
+                 f"WHERE resumes_fts MATCH ? AND rowid IN ({','.join('?' * len(ids))})", [match] + ids)
+    return {r['id']: r['snippet'] for r in rows}
+def enqueue_task(kind, payload, priority=0, max_attempts=3):
+    with get_pool().transaction() as conn:
+        return conn.execute("INSERT INTO tasks (kind,payload,priority,max_attempts) VALUES (?,?,?,?)", (kind, json.dumps(payload), priority, max_attempts)).lastrowid
+def claim_task(now, owner, lease_s):
+    """Atomically move the highest-priority runnable task to 'running', leased to ``owner``
+    for ``lease_s`` seconds, and return it (or None)."""
+    with get_pool().transaction(immediate=True) as conn:
+        row = conn.execute("SELECT * FROM tasks WHERE status='queued' AND run_after<=? ORDER BY priority DESC, id LIMIT 1", (now,)).fetchone()
+        if row is not None:
+            conn.execute("UPDATE tasks SET status='running', attempts=attempts+1, owner=?, lease_until=?, updated_at=CURRENT_TIMESTAMP WHERE id=?", (owner, now + lease_s, row['id']))
+        return row
+def finish_task(task_id, result, owner):
+    # a no-op when the lease expired and the task went to another worker
+    with get_pool().transaction() as conn:
+        conn.execute("UPDATE tasks SET status='done', result=?, error=NULL, updated_at=CURRENT_TIMESTAMP WHERE id=? AND owner=? AND status='running'", (json.dumps(result), task_id, owner))
+def fail_task(task_id, error, owner, retry_at=None):
+    """Re-queue the task for ``retry_at`` or, when None (attempts exhausted or the error is
+    permanent), mark it failed."""
+    with get_pool().transaction() as conn:
+        if retry_at is None: conn.execute("UPDATE tasks SET status='failed', error=?, updated_at=CURRENT_TIMESTAMP WHERE id=? AND owner=? AND status='running'", (error, task_id, owner))
+        else: conn.execute("UPDATE tasks SET status='queued', error=?, run_after=?, updated_at=CURRENT_TIMESTAMP WHERE id=? AND owner=? AND status='running'", (error, retry_at, task_id, owner))
+def renew_task_leases(owner, until):
+    with get_pool().transaction() as conn:
+        conn.execute("UPDATE tasks SET lease_until=? WHERE owner=? AND status='running'", (until, owner))
+def requeue_expired_tasks(now):
+    """Re-queue tasks whose worker process died or hung (nobody renewed the lease; rows from
+    before leases have none), or fail them once they have used up their attempts: a payload
+    that kills its worker must not be retried forever. Returns the number re-queued."""
+    expired = "status='running' AND (lease_until IS NULL OR lease_until<?)"
+    with get_pool().transaction() as conn:
+        conn.execute(f"UPDATE tasks SET status='failed', error='lease expired', updated_at=CURRENT_TIMESTAMP WHERE {expired} AND attempts>=max_attempts", (now,))
+        return conn.execute(f"UPDATE tasks SET status='queued', updated_at=CURRENT_TIMESTAMP WHERE {expired} AND attempts<max_attempts", (now,)).rowcount
+def get_task(task_id):
+    return _read("SELECT * FROM tasks WHERE id=?", (task_id,), one=True)
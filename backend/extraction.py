@@ -0,0 +1,82 @@
+import os, time, hashlib, logging, weakref
+from backend.parsers import PARSER_VERSION, document_kind, decode_text, pdf_page_count, extract_pdf_pages, extract_docx
+from backend.db import get_cached_text, put_cached_text
+from backend.workers import Lazy, mp_context
+from metrics import CACHE_LOOKUPS
+logger = logging.getLogger(__name__)
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', '0')) or min(4, os.cpu_count() or 1)
+PARSE_TIMEOUT_S = float(os.getenv('PARSE_TIMEOUT_S', '20'))
+PARSE_MAX_PAGES = int(os.getenv('PARSE_MAX_PAGES', '50'))
+PAGES_PER_TASK = int(os.getenv('PARSE_PAGES_PER_TASK', '4'))
+class ParseTimeout(Exception):
+    pass
+# multiprocessing.Pool rather than ProcessPoolExecutor: a worker stuck on a hostile
+# document can only be stopped by terminating the pool. Workers are recycled to
+# cap parser memory growth, and started without fork (see workers.mp_context).
+_POOL = Lazy(lambda: mp_context().Pool(PARSE_WORKERS, maxtasksperchild=100))
+def get_pool(): return _POOL.get()
+def pool_started(): return _POOL.peek() is not None
+_RESET = weakref.WeakSet()  # pools terminated by _reset_pool
+class _PoolReset(Exception):
+    pass
+def _reset_pool(pool):
+    # later calls get a fresh pool; documents in flight on this one see it in _wait and resubmit
+    _RESET.add(pool); _POOL.reset(pool)
+    pool.terminate()
+def _wait(pool, results, deadline):
+    # short waits so a document sharing the pool with a timed-out one notices the reset
+    # at once instead of waiting out its own deadline
+    for r in results:
+        while not r.ready():
+            if pool in _RESET: raise _PoolReset()
+            left = deadline - time.monotonic()
+            if left <= 0: _reset_pool(pool); raise ParseTimeout("document parsing timed out")
+            r.wait(min(left, 0.05))
+    return [r.get() for r in results]
+def _extract_pdf(pool, content, deadline, max_pages):
+    n = min(_wait(pool, [pool.apply_async(pdf_page_count, (content,))], deadline)[0], max_pages)
+    if n == 0: return ""
+    ranges = [(i, min(i + PAGES_PER_TASK, n)) for i in range(0, n, PAGES_PER_TASK)]
+    parts = _wait(pool, [pool.apply_async(extract_pdf_pages, (content, a, b)) for a, b in ranges], deadline)
+    return "\n".join(page for part in parts for page in part)
+def _cache_key(content, kind, max_pages):
+    # the text depends on the parser code and, for PDFs, on the page cap as well as the bytes
+    h = hashlib.sha256(f"v{PARSER_VERSION}:{kind}:{max_pages if kind == 'pdf' else ''}\0".encode())
+    h.update(content); return h.hexdigest()
+def extract(content, filename="", content_type="", timeout=PARSE_TIMEOUT_S, max_pages=PARSE_MAX_PAGES):
+    """Text of an uploaded document, parsed off the calling process.
+
+    PDF pages are split into ranges extracted in parallel; pages past
+    ``max_pages`` are ignored. Raises ParseTimeout when the whole document takes
+    longer than ``timeout`` seconds. Other parser failures are logged and give
+    "" (as ``parsers.extract_text`` does). Results are cached by the SHA-256 of
+    ``content``, the page cap and PARSER_VERSION, so the same file is only
+    parsed once per setting.
+    """
+    kind = document_kind(filename, content_type)
+    if kind == "text": return decode_text(content)
+    key = _cache_key(content, kind, max_pages)
+    text = get_cached_text(key)
+    CACHE_LOOKUPS.inc(cache='text', result='miss' if text is None else 'hit')
+    if text is not None: return text
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            pool = get_pool()
+            try:
+                if kind == "pdf": text = _extract_pdf(pool, content, deadline, max_pages)
+                else: text = _wait(pool, [pool.apply_async(extract_docx, (content,))], deadline)[0]
+                break
+            except ParseTimeout: raise
+            except Exception:  # _PoolReset, or "Pool not running" from apply_async on a pool reset meanwhile
+                if pool not in _RESET: raise
+                logger.info("parser pool reset while parsing %r; resubmitting", filename)
+    except ParseTimeout:
+        logger.warning("parsing %r timed out", filename); raise
+    except Exception:
+        logger.exception("extract failed for %r", filename); return ""
+    put_cached_text(key, text)
+    return text
+def shutdown():
+    pool = _POOL.peek()
+    if pool is not None: _reset_pool(pool)
@@ -0,0 +1,88 @@
+import os, time, hashlib, logging, zipfile
+from concurrent.futures import ThreadPoolExecutor
+from backend.extraction import extract, PARSE_WORKERS
+from backend.db import get_resume_ids_by_hash, add_resume_files
+from backend.workers import Lazy, ndjson, chunked, pipelined
+from utils import parse_name_email_from_text
+logger = logging.getLogger(__name__)
+INGEST_CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', '64'))
+INGEST_MAX_FILE_MB = float(os.getenv('INGEST_MAX_FILE_MB', '10'))
+RESUME_EXTENSIONS = ('.pdf', '.docx', '.doc', '.txt'); RESUME_TYPES = ('application/pdf', 'text/plain')
+ZIP_TYPES = ('application/zip', 'application/x-zip-compressed')
+# extract() blocks while the parser pool works; two waiting threads per parser process keep it busy
+_THREADS = Lazy(lambda: ThreadPoolExecutor(2 * PARSE_WORKERS, thread_name_prefix='ingest'))
+def shutdown(): _THREADS.close(lambda t: t.shutdown(wait=False, cancel_futures=True))
+def is_zip(filename, content_type=""): return (filename or "").lower().endswith('.zip') or content_type in ZIP_TYPES
+def iter_files(uploads, max_bytes):
+    """(name, content_type, bytes) of every file in ``uploads``, (path, filename, content_type)
+    of files on disk, with ZIP archives expanded one member at a time. Files that cannot be
+    read come with the exception instead of the bytes."""
+    for path, filename, ctype in uploads:
+        if not is_zip(filename, ctype):
+            if os.path.getsize(path) > max_bytes: yield filename, ctype, ValueError("file too large"); continue
+            with open(path, 'rb') as f: data = f.read()
+            yield filename, ctype, data; continue
+        try: zf = zipfile.ZipFile(path)
+        except zipfile.BadZipFile as ex: yield filename, ctype, ex; continue
+        with zf:
+            for info in zf.infolist():
+                base = os.path.basename(info.filename)
+                if info.is_dir() or info.filename.startswith('__MACOSX/') or base.startswith('.'): continue
+                name = f"{filename}/{info.filename}"
+                if info.file_size > max_bytes: yield name, "", ValueError("file too large"); continue
+                try:
+                    with zf.open(info) as f: data = f.read(max_bytes + 1)  # the header's size is not to be trusted
+                except Exception as ex:  # encrypted, corrupt or an unsupported compression method
+                    yield name, "", ex; continue
+                yield name, "", data if len(data) <= max_bytes else ValueError("file too large")
+def _parse(name, ctype, data):
+    text = extract(data, name, ctype)
+    if not text.strip(): raise ValueError("no text could be extracted")
+    return text
+def stream_ingest(uploads, location="", chunk_size=INGEST_CHUNK_SIZE, max_file_mb=INGEST_MAX_FILE_MB):
+    """Store every resume in ``uploads`` (see ``iter_files``) and yield NDJSON lines.
+
+    Files are read a chunk at a time; a chunk's files are parsed concurrently
+    with ``extract`` while the previous chunk is inserted in a single
+    transaction. Name and email are filled in from the text. Files whose
+    SHA-256 is already stored, or seen earlier in the upload, are reported as
+    duplicates without being parsed (as failed, when that earlier copy could
+    not be parsed). Every file gets one "file" line with its
+    status: added, duplicate, failed or skipped (not a resume type).
+    """
+    t0 = time.time(); threads = _THREADS.get(); max_bytes = int(max_file_mb * 2 ** 20)
+    counts = dict.fromkeys(('added', 'duplicate', 'failed', 'skipped'), 0); seen = {}  # content hash -> resume id (None until stored)
+    errors = {}  # content hash -> why its first copy could not be parsed
+    yield ndjson({"event": "start", "uploads": len(uploads)})
+    def submit(chunk):
+        hashes = [hashlib.sha256(d).hexdigest() if isinstance(d, bytes) else None for _, _, d in chunk]
+        seen.update(get_resume_ids_by_hash({h for h in hashes if h and h not in seen}))
+        entries = []
+        for (name, ctype, data), h in zip(chunk, hashes):
+            if h is None: entries.append((name, h, {"status": "failed", "error": str(data) or type(data).__name__}))
+            elif not name.lower().endswith(RESUME_EXTENSIONS) and ctype not in RESUME_TYPES: entries.append((name, h, {"status": "skipped"}))
+            elif h in seen: entries.append((name, h, {"status": "duplicate"}))
+            else: seen[h] = None; entries.append((name, h, threads.submit(_parse, name, ctype, data)))
+        return entries
+    def drain(entries):
+        parsed = []
+        for i, (name, h, res) in enumerate(entries):
+            if isinstance(res, dict): continue
+            try: text = res.result()
+            except Exception as ex:  # ParseTimeout or no text; copies read after this chunk get another try
+                logger.warning("bulk ingest could not parse %r: %s", name, ex)
+                seen.pop(h, None); errors[h] = str(ex); entries[i] = (name, h, {"status": "failed", "error": str(ex)}); continue
+            person, email = parse_name_email_from_text(text); parsed.append((i, (person, email, location, text, h)))
+        for (i, row), (rid, added) in zip(parsed, add_resume_files([row for _, row in parsed])):
+            seen[row[4]] = rid
+            entries[i] = (entries[i][0], row[4], {"status": "added" if added else "duplicate", "resume_id": rid, "name": row[0], "email": row[1]})
+        lines = []
+        for name, h, out in entries:
+            # a copy marked duplicate while the first was being parsed shares its fate when that failed
+            if out["status"] == "duplicate" and "resume_id" not in out:
+                out = {"status": "duplicate", "resume_id": seen[h]} if seen.get(h) is not None else {"status": "failed", "error": errors[h]}
+            counts[out["status"]] += 1; lines.append(dict({"event": "file", "file": name, "content_hash": h}, **out))
+        lines.append(dict({"event": "progress"}, **counts))
+        return "".join(ndjson(l) for l in lines)
+    yield from pipelined(chunked(iter_files(uploads, max_bytes), max(1, chunk_size)), submit, drain)
+    yield ndjson(dict({"event": "done"}, **counts, elapsed_s=round(time.time() - t0, 3)))
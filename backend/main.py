@@ -1,45 +1,105 @@
-from fastapi import FastAPI, UploadFile, File, Form, BackgroundTasks, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, BackgroundTasks, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn, io, json, os, sys
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+import uvicorn, io, csv, json, os, sys, time, shutil, hashlib, tempfile, threading
 # Ensure project root is on sys.path so imports like 'db' work when running uvicorn
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-from backend.parsers import extract_text
-from backend.db import init_db, add_job, get_jobs, add_resume, add_evaluation, get_evaluations_for_job, get_resume
-from backend.scoring import evaluate_resume_for_jd
-from embeddings import get_embedding
+from backend.extraction import extract, ParseTimeout, shutdown as shutdown_extraction, get_pool as get_parser_pool, pool_started as parser_pool_started
+from backend.db import init_db, PoolTimeout, get_pool as get_db_pool, update_evaluation_details, get_evaluation, add_job, get_jobs, get_job, add_resume, add_evaluation, query_evaluations, iter_evaluations, get_resume, get_resumes, get_evaluated_resume_ids, update_job, get_job_profile, set_job_profile
+from backend.scoring import evaluate_resume_for_jd, embed_resume, compile_job_profile, profile_is_current, profile_to_json, profile_from_json
+from backend.bulk import stream_evaluations, shutdown as shutdown_bulk
+from backend.ingest import stream_ingest, shutdown as shutdown_ingest
+from backend.search import hybrid_search
+from backend.rescore import rescore_job
+from backend.tasks import TaskQueue, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from backend.skill_matcher import get_matcher
+from llm_feedback import request_feedback, llm_stats
+from embeddings import get_embeddings, get_model, model_status, CACHE as EMBED_CACHE
+from backend.batching import EmbeddingBatcher
 from vectorstore import SimpleVectorStore
+import metrics
+from metrics import stage, begin_request, server_timing, maybe_profile, finish_profile
 app = FastAPI(title="Automated Resume Relevance API")
 app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_credentials=True, allow_methods=['*'], allow_headers=['*'])
-init_db(); store = SimpleVectorStore(path='vectorstore_api')
+init_db()
+_STORE = None; _STORE_LOCK = threading.Lock()
+def get_store():
+    # opened on first use so importing the app stays cheap
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            # VECTOR_DTYPE=int8 holds a quarter of the memory at about float32 speed; float16 halves it but searches ~12x slower
+            store = SimpleVectorStore(path='vectorstore_api', index=os.getenv('VECTOR_INDEX') or None, nprobe=int(os.getenv('VECTOR_NPROBE', '8')),
+                                      dtype=os.getenv('VECTOR_DTYPE', 'float32'))
+            # stores written before upserts held one row per evaluation; keep the newest per resume
+            if not store.keyed: print('vector store: removed %d duplicate rows' % store.dedupe(lambda m: m.get('resume_id')))
+            _STORE = store
+        return _STORE
+metrics.Gauge('jobsync_vector_store_size', 'Vectors in the API store (0 until it is opened).', fn=lambda: len(_STORE) if _STORE is not None else 0)
+metrics.Gauge('jobsync_embedding_cache_entries', 'Embeddings held in memory.', fn=lambda: EMBED_CACHE.stats()['size'])
+@app.middleware('http')
+async def _timing(request, call_next):
+    """Request latency histogram, a Server-Timing header with per-stage times and,
+    with PROFILE_SLOW_MS set, a sampled profile of slow requests."""
+    timings = begin_request(); sampler = maybe_profile(); t = time.perf_counter()
+    response = await call_next(request)
+    # the matched route's template, so unknown paths (scanners, typos) cannot add label values
+    dt = time.perf_counter() - t; matched = request.scope.get('route'); route = getattr(matched, 'path', None) or 'unmatched'
+    metrics.REQUEST_SECONDS.observe(dt, method=request.method, route=route, status=response.status_code)
+    response.headers['Server-Timing'] = server_timing(timings, dt)
+    finish_profile(sampler, f'{request.method} {route}', dt)
+    return response
+@app.exception_handler(PoolTimeout)
+async def _pool_exhausted(request, ex): return JSONResponse({'detail': str(ex)}, status_code=503, headers={'Retry-After': '1'})
+# concurrent handlers share one encoder forward pass per micro-batch
+embedder = EmbeddingBatcher(get_embeddings, max_batch=int(os.getenv('EMBED_BATCH_SIZE', '32')), max_wait_ms=float(os.getenv('EMBED_BATCH_WAIT_MS', '5')))
 def _get_job_by_id(job_id: int):
-    for row in get_jobs():
-        r = dict(row)
-        if int(r.get('id'))==int(job_id): return r
-    return None
+    row = get_job(job_id)
+    return dict(row) if row is not None else None
+_PROFILES = {}  # job_id -> compiled profile, valid while its jd_hash matches the row's
+def _job_profile(job):
+    p = _PROFILES.get(job['id'])
+    if p is not None and p['jd_hash'] == job.get('jd_hash'): return p
+    p = profile_from_json(get_job_profile(job['id']))
+    if not profile_is_current(p, job.get('jd_hash')):
+        p = compile_job_profile(job['jd_text'], embedder.embed(job['jd_text']))
+        set_job_profile(job['id'], p['jd_hash'], profile_to_json(p))
+    _PROFILES[job['id']] = p; return p
+def _compile_job(job_id: int):
+    _PROFILES.pop(job_id, None)
+    job = _get_job_by_id(job_id)
+    if job is not None: _job_profile(job)
+def _parse_upload(content, filename, content_type, fallback=True):
+    """Extract text from upload bytes on the parser pool; call via run_in_threadpool."""
+    try:
+        with stage('parse'): text = extract(content, filename or "", content_type or "")
+    except ParseTimeout as ex:
+        raise HTTPException(status_code=422, detail=f"Could not parse {filename}: {ex}")
+    if not text and fallback:
+        # If extract returned empty, try naive decode for txt fallback
+        text = content.decode('utf-8', errors='ignore')
+    return text
+def _index_resume(r, vec):
+    # a resume's text, so its vector, never changes: store it once, not again per evaluation
+    store = get_store()
+    if r['id'] not in store: store.upsert(r['id'], vec, {'resume_id': r['id'], 'name': r['name'], 'email': r['email'], 'location': r['location']})
 @app.post('/jobs')
 async def create_job(title: str = Form(...), location: str = Form(''), jd_file: UploadFile = File(...)):
      try:
         content = await jd_file.read()
-        # build a small file-like object that our parsers.extract_text expects
-        class FObj:
-            def __init__(self, b, filename, content_type):
-                self._b = b
-                self.name = filename
-                self.type = content_type
-            def read(self):
-                return self._b
-        fobj = FObj(content, jd_file.filename or "", jd_file.content_type or "")
-        jd_text = extract_text(fobj)
-        if not jd_text:
-            # If extract_text returned empty, try naive decode for txt fallback
-            try:
-                jd_text = content.decode('utf-8', errors='ignore')
-            except:
-                jd_text = ""
+        jd_text = await run_in_threadpool(_parse_upload, content, jd_file.filename, jd_file.content_type)
         if not title or not jd_text:
             raise ValueError("Missing title or JD text after parsing.")
         job_id = add_job(title, jd_text, location)
+        # the JD never changes after this point, so all per-job scoring work happens once here
+        await run_in_threadpool(_compile_job, job_id)
         return {"job_id": job_id}
+     except HTTPException:
+        raise
      except Exception as e:
         # return a helpful error to the client and log server side
         import traceback, sys
@@ -48,34 +108,211 @@ async def create_job(title: str = Form(...), location: str = Form(''), jd_file:
         raise HTTPException(status_code=500, detail=f"Failed to add job: {str(e)}")
 @app.get('/jobs')
 def list_jobs(): return [dict(r) for r in get_jobs()]
+@app.put('/jobs/{job_id}')
+async def edit_job(job_id: int, title: str = Form(None), location: str = Form(None), jd_text: str = Form(None), jd_file: UploadFile = File(None)):
+    if jd_file is not None: jd_text = await run_in_threadpool(_parse_upload, await jd_file.read(), jd_file.filename, jd_file.content_type)
+    if not update_job(job_id, title, jd_text or None, location): raise HTTPException(status_code=404, detail='job not found')
+    if jd_text: await run_in_threadpool(_compile_job, job_id)
+    return {"job_id": job_id}
 @app.post('/resumes')
 async def upload_resume(file: UploadFile = File(...), name: str = Form(''), email: str = Form(''), location: str = Form('')):
     content = await file.read()
-    class _F: 
-        def __init__(self,b,fn,ct): self._b=b; self.name=fn; self.type=ct
-        def read(self): return self._b
-    fobj = _F(content, file.filename, file.content_type)
-    raw_text = extract_text(fobj); rid = add_resume(name, email, location, raw_text); return {'resume_id': rid}
-@app.post('/evaluate_sync')
-def evaluate_sync(resume_id: int = Form(...), job_id: int = Form(...)):
+    raw_text = await run_in_threadpool(_parse_upload, content, file.filename, file.content_type, False)
+    rid = add_resume(name, email, location, raw_text, hashlib.sha256(content).hexdigest()); return {'resume_id': rid}
+def _spool(src, path):
+    with open(path, 'wb') as f: shutil.copyfileobj(src, f, 1 << 20)
+    return path
+@app.post('/resumes/bulk')
+async def upload_resumes(files: List[UploadFile] = File(...), location: str = Form('')):
+    """Store many resumes: files and/or ZIP archives of them, streaming NDJSON progress
+    (see ``stream_ingest``). Uploads are copied to disk, never held in memory whole."""
+    tmp = tempfile.mkdtemp(prefix='jobsync-ingest-')
+    try: uploads = [(await run_in_threadpool(_spool, f.file, os.path.join(tmp, str(i))), f.filename, f.content_type) for i, f in enumerate(files)]
+    except BaseException: shutil.rmtree(tmp, ignore_errors=True); raise
+    return StreamingResponse(stream_ingest(uploads, location), media_type='application/x-ndjson', background=BackgroundTask(shutil.rmtree, tmp, ignore_errors=True))
+LLM_DEFERRED = os.getenv('LLM_DEFERRED', '0') == '1'
+# deferred LLM completions finish on the LLM client's event loop; their database writes go here
+_FEEDBACK_WRITER = ThreadPoolExecutor(1, thread_name_prefix='llm-feedback-writer')
+def _fill_llm_feedback(evaluation_id, details, fut):
+    # swap the rule-based feedback for the LLM's once its completion finishes
+    # the evaluation must not stay pending: a failed completion keeps the rule-based feedback
+    try: lines = None if fut.cancelled() else fut.result()
+    except Exception as ex: print('llm feedback error', evaluation_id, ex, file=sys.stderr); lines = None
+    details = dict(details, llm_pending=False)
+    if lines: details.update(feedback=lines, llm_used=True)
+    update_evaluation_details(evaluation_id, details)
+def _run_evaluation(resume_id: int, job_id: int, defer_llm: bool = False):
     job = _get_job_by_id(job_id); 
     if job is None: raise HTTPException(status_code=404, detail='job not found')
     r = get_resume(resume_id)
     if r is None: raise HTTPException(status_code=404, detail='resume not found')
-    score, verdict, details = evaluate_resume_for_jd(r['raw_text'], job['jd_text'])
-    add_evaluation(resume_id, job_id, score, verdict, details)
+    profile = _job_profile(job)
+    with stage('embed'): vec, chunk_embs = embed_resume(r['raw_text'], embedder.embed_many)
+    score, verdict, details = evaluate_resume_for_jd(r['raw_text'], job['jd_text'], profile=profile, resume_chunk_embs=chunk_embs, defer_llm=defer_llm)
+    with stage('db_write'): eid = add_evaluation(resume_id, job_id, score, verdict, details, profile['jd_hash'])
+    if details.get('llm_pending'):
+        fut = request_feedback(r['raw_text'], job['jd_text'], details['missing_skills'], details['hard_matches'])
+        if fut is not None: fut.add_done_callback(lambda f: _FEEDBACK_WRITER.submit(_fill_llm_feedback, eid, details, f))
     try:
-        vec = get_embedding(r['raw_text']); store.add(vec, {'resume_id': resume_id, 'job_id': job_id, 'name': r['name'], 'email': r['email'], 'location': r['location']})
+        _index_resume(r, vec)
     except Exception as ex:
         print('embedding error', ex)
-    return {'score': score, 'verdict': verdict, 'details': details}
+    return {'evaluation_id': eid, 'score': score, 'verdict': verdict, 'details': details}
+tasks = TaskQueue({'evaluate': _run_evaluation}, workers=int(os.getenv('TASK_WORKERS', '2')))
+def _read_one():
+    with get_db_pool().connection() as conn: conn.execute("SELECT 1").fetchone()
+_WARMUP = {'state': 'cold', 'timings_ms': {}, 'error': None}; _WARMUP_LOCK = threading.Lock()
+def _warmup():
+    """Load every lazily-initialised component; safe to call repeatedly and concurrently."""
+    with _WARMUP_LOCK:
+        if _WARMUP['state'] == 'ready': return _WARMUP
+        _WARMUP['state'] = 'warming'
+        steps = [('database', _read_one), ('embedding_model', lambda: (get_model(), embedder.embed('warm up'))),
+                 ('vector_store', get_store), ('skill_matcher', lambda: get_matcher(('python',)).match('python')),
+                 ('parser_pool', get_parser_pool)]
+        try:
+            for name, step in steps:
+                t = time.perf_counter(); step(); _WARMUP['timings_ms'][name] = round(1e3 * (time.perf_counter() - t), 1)
+            _WARMUP['state'] = 'ready'; _WARMUP['error'] = None
+        except Exception as ex:
+            _WARMUP['state'] = 'failed'; _WARMUP['error'] = str(ex)
+        return _WARMUP
+def _components():
+    db_ok = True
+    try: _read_one()
+    except Exception: db_ok = False
+    return {'database': 'ok' if db_ok else 'error', 'embedding_model': model_status(),
+            'vector_store': 'loaded' if _STORE is not None else 'not_loaded',
+            'parser_pool': 'started' if parser_pool_started() else 'not_started', 'task_workers': tasks.alive_workers()}
+@app.on_event('startup')
+def _start_tasks():
+    tasks.start()
+    if os.getenv('WARMUP_ON_STARTUP', '1') == '1': threading.Thread(target=_warmup, daemon=True).start()
+@app.on_event('shutdown')
+def _stop_tasks():
+    global _STORE
+    tasks.stop(); shutdown_extraction(); shutdown_bulk(); shutdown_ingest()
+    with _STORE_LOCK:
+        # waits for a running compaction, so exiting leaves no half-written segment files
+        if _STORE is not None: _STORE.close(); _STORE = None
+@app.get('/healthz')
+def liveness(): return {'status': 'alive'}
+@app.get('/readyz')
+def readiness():
+    """200 once warm-up has finished and the database answers, 503 until then."""
+    components = _components(); ready = _WARMUP['state'] == 'ready' and components['database'] == 'ok'
+    body = {'status': 'ready' if ready else _WARMUP['state'], 'components': components, 'warmup_ms': _WARMUP['timings_ms']}
+    return JSONResponse(body, status_code=200 if ready else 503)
+@app.post('/warmup')
+def warmup():
+    w = _warmup()
+    return JSONResponse({'status': w['state'], 'error': w['error'], 'warmup_ms': w['timings_ms'], 'components': _components()},
+                        status_code=200 if w['state'] == 'ready' else 500)
+@app.post('/evaluate_sync')
+def evaluate_sync(resume_id: int = Form(...), job_id: int = Form(...), defer_llm: bool = Form(LLM_DEFERRED)):
+    """With defer_llm the rule-based feedback is returned at once; poll /evaluation/{evaluation_id} for the LLM's."""
+    return _run_evaluation(resume_id, job_id, defer_llm)
+@app.get('/evaluation/{evaluation_id}')
+def evaluation(evaluation_id: int):
+    e = get_evaluation(evaluation_id)
+    if e is None: raise HTTPException(status_code=404, detail='evaluation not found')
+    return dict(e, details=json.loads(e['details'] or '{}'))
+@app.post('/evaluate_async')
+def evaluate_async(resume_id: int = Form(...), job_id: int = Form(...), priority: int = Form(PRIORITY_INTERACTIVE)):
+    if _get_job_by_id(job_id) is None: raise HTTPException(status_code=404, detail='job not found')
+    if get_resume(resume_id) is None: raise HTTPException(status_code=404, detail='resume not found')
+    return {'task_id': tasks.submit('evaluate', {'resume_id': resume_id, 'job_id': job_id}, priority=priority)}
+@app.get('/tasks/{task_id}')
+def task_status(task_id: int):
+    t = tasks.status(task_id)
+    if t is None: raise HTTPException(status_code=404, detail='task not found')
+    return t
+@app.post('/jobs/{job_id}/evaluate_all')
+def evaluate_all(job_id: int, include_details: bool = False):
+    job = _get_job_by_id(job_id)
+    if job is None: raise HTTPException(status_code=404, detail='job not found')
+    profile = _job_profile(job)
+    work = [(dict(r), job, profile) for r in get_resumes()]
+    return StreamingResponse(stream_evaluations(work, embedder.embed_many, lambda r, j, vec: _index_resume(r, vec), include_details), media_type='application/x-ndjson')
+@app.post('/jobs/{job_id}/evaluate_all_async')
+def evaluate_all_async(job_id: int, priority: int = PRIORITY_BULK):
+    # queued behind interactive /evaluate_async requests
+    if _get_job_by_id(job_id) is None: raise HTTPException(status_code=404, detail='job not found')
+    return {'task_ids': [tasks.submit('evaluate', {'resume_id': r['id'], 'job_id': job_id}, priority=priority) for r in get_resumes()]}
+@app.post('/resumes/{resume_id}/evaluate_all_jobs')
+def evaluate_all_jobs(resume_id: int, include_details: bool = False):
+    r = get_resume(resume_id)
+    if r is None: raise HTTPException(status_code=404, detail='resume not found')
+    jobs = [dict(j) for j in get_jobs()]
+    work = [(dict(r), j, _job_profile(j)) for j in jobs]
+    return StreamingResponse(stream_evaluations(work, embedder.embed_many, lambda r, j, vec: _index_resume(r, vec), include_details), media_type='application/x-ndjson')
+@app.post('/jobs/{job_id}/rescore')
+def rescore(job_id: int):
+    """Recompute score and verdict of the job's evaluations from their stored components
+    after a change to WEIGHTS, VERDICTS or COMMON_SKILLS; nothing is re-embedded."""
+    job = _get_job_by_id(job_id)
+    if job is None: raise HTTPException(status_code=404, detail='job not found')
+    return rescore_job(job_id, _job_profile(job))
+@app.post('/rescore')
+def rescore_all(): return [rescore_job(j['id'], _job_profile(dict(j))) for j in get_jobs()]
+def _decode_cursor(cursor):
+    try:
+        score, eid = cursor.rsplit(':', 1); return float(score), int(eid)
+    except (AttributeError, ValueError): raise HTTPException(status_code=400, detail='invalid cursor')
 @app.get('/evaluations/{job_id}')
-def evaluations_for_job(job_id: int): return [dict(r) for r in get_evaluations_for_job(job_id)]
+def evaluations_for_job(job_id: int, min_score: float = None, location: str = None, verdict: str = None,
+                        limit: int = Query(100, ge=1, le=1000), cursor: str = None, include_details: bool = False):
+    """One page of evaluations, best first. Pass ``next_cursor`` back as ``cursor`` for the next page."""
+    after = _decode_cursor(cursor) if cursor else None
+    rows = query_evaluations(job_id, min_score, location, verdict, limit + 1, after, include_details)
+    items = [dict(r) for r in rows[:limit]]
+    for it in items:
+        if 'details' in it: it['details'] = json.loads(it['details'] or '{}')
+    next_cursor = f"{items[-1]['score']!r}:{items[-1]['id']}" if len(rows) > limit else None
+    return {'items': items, 'next_cursor': next_cursor}
+@app.get('/evaluations/{job_id}/export.csv')
+def export_evaluations(job_id: int, min_score: float = None, location: str = None, verdict: str = None):
+    def rows():
+        buf = io.StringIO(); w = csv.writer(buf)
+        w.writerow(['candidate_name', 'email', 'location', 'score', 'verdict', 'missing'])
+        for n, r in enumerate(iter_evaluations(job_id, min_score, location, verdict, include_details=True), 1):
+            missing = json.loads(r['details'] or '{}').get('missing_skills', [])
+            w.writerow([r['candidate_name'], r['candidate_email'], r['candidate_location'], r['score'], r['verdict'], ','.join(missing)])
+            if n % 500 == 0: yield buf.getvalue(); buf.seek(0); buf.truncate()
+        yield buf.getvalue()
+    return StreamingResponse(rows(), media_type='text/csv', headers={'Content-Disposition': f'attachment; filename="evaluations_job_{job_id}.csv"'})
 @app.get('/search_from_job/{job_id}')
-def search_from_job(job_id: int, top_k: int = 5):
+def search_from_job(job_id: int, top_k: int = 5, location: str = None, not_evaluated: bool = False, since: float = None, until: float = None):
+    """Resumes closest to the job. Optional filters: exact ``location``, only resumes not yet
+    evaluated for this job, and ``since``/``until`` (unix seconds) on when the resume was indexed."""
     job = _get_job_by_id(job_id); 
     if job is None: raise HTTPException(status_code=404, detail='job not found')
-    qvec = get_embedding(job['jd_text']); results = store.search(qvec, top_k=top_k); out=[]
+    where = {}; exclude = {}
+    if location: where['location'] = location
+    if since is not None or until is not None: where['_added_at'] = (since, until)
+    if not_evaluated: exclude['_id'] = set(get_evaluated_resume_ids(job_id))
+    qvec = _job_profile(job)['jd_embedding']; results = get_store().search(qvec, top_k=top_k, where=where, exclude=exclude); out=[]
     for meta, score in results: out.append({'meta': meta, 'score': score})
     return out
+@app.get('/search')
+def search(q: str, top_k: int = Query(10, ge=1, le=200), job_id: int = None, location: str = None, match: str = Query('all', pattern='^(all|any)$'),
+           prefilter: bool = True, candidates: int = Query(1000, ge=1, le=10000)):
+    """Keyword + semantic resume search. ``q`` is matched against the full-text index
+    (words, or "quoted phrases"; ``match=any`` needs only one of them) and, unless
+    ``job_id`` is given, is also embedded for the semantic side. The two rankings are
+    merged with reciprocal rank fusion; with ``prefilter`` only keyword hits are returned."""
+    if job_id is not None:
+        job = _get_job_by_id(job_id)
+        if job is None: raise HTTPException(status_code=404, detail='job not found')
+        qvec = _job_profile(job)['jd_embedding']
+    else:
+        with stage('embed'): qvec = embedder.embed(q)
+    try: return hybrid_search(q, qvec, get_store(), top_k, location, match == 'all', prefilter, candidates)
+    except ValueError as ex: raise HTTPException(status_code=400, detail=str(ex))
+@app.get('/stats/embeddings')
+def embedding_stats(): return {'batcher': embedder.stats(), 'cache': EMBED_CACHE.stats()}
+@app.get('/stats/llm')
+def llm_feedback_stats(): return llm_stats()
+@app.get('/metrics')
+def prometheus_metrics(): return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
 if __name__=='__main__': uvicorn.run('backend.main:app', host='0.0.0.0', port=8000, reload=True)
@@ -1,21 +1,37 @@
-import io, pdfplumber, docx, re, logging
+import io, re, logging
 logger = logging.getLogger(__name__)
+PARSER_VERSION = 1  # part of the parsed-text cache key: bump when extraction output changes
+def document_kind(filename, content_type=""):
+    """'pdf', 'docx' or 'text' — decides how an upload is parsed."""
+    fname = (filename or "").lower()
+    if content_type == "text/plain": return "text"
+    if fname.endswith(".pdf"): return "pdf"
+    if fname.endswith(('.docx','.doc')): return "docx"
+    return "text"
+def decode_text(content):
+    try: return content.decode('utf-8', errors='ignore')
+    except: return str(content)
+# The three functions below only take and return plain data, so they can run in worker processes.
+# pdfplumber and python-docx are imported on first use: they are slow to import and
+# most processes that import this module only need normalize_text.
+def pdf_page_count(content):
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(content)) as pdf: return len(pdf.pages)
+def extract_pdf_pages(content, start=0, stop=None):
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(content)) as pdf:
+        return [p.extract_text() or "" for p in pdf.pages[start:stop]]
+def extract_docx(content):
+    import docx
+    doc = docx.Document(io.BytesIO(content))
+    return "\n".join([p.text for p in doc.paragraphs if p.text])
 def extract_text(file_obj):
     try:
         content = file_obj.read()
-        fname = getattr(file_obj, "name", "")
-        if hasattr(file_obj, "type") and file_obj.type == "text/plain":
-            try: return content.decode('utf-8', errors='ignore')
-            except: return str(content)
-        if fname.lower().endswith(".pdf"):
-            with pdfplumber.open(io.BytesIO(content)) as pdf:
-                pages=[p.extract_text() or "" for p in pdf.pages]
-                return "\n".join(pages)
-        if fname.lower().endswith(('.docx','.doc')):
-            doc = docx.Document(io.BytesIO(content))
-            return "\n".join([p.text for p in doc.paragraphs if p.text])
-        try: return content.decode('utf-8', errors='ignore')
-        except: return str(content)
+        kind = document_kind(getattr(file_obj, "name", ""), getattr(file_obj, "type", ""))
+        if kind == "pdf": return "\n".join(extract_pdf_pages(content))
+        if kind == "docx": return extract_docx(content)
+        return decode_text(content)
     except Exception:
         logger.exception("extract_text failed"); return ""
 def normalize_text(text):
@@ -0,0 +1,73 @@
+import time
+import numpy as np
+from backend.db import get_score_components, get_skill_lists, get_resume_texts, get_evaluation_details, update_scores, skills_key
+from backend.parsers import normalize_text
+from backend.scoring import WEIGHTS, verdict_for
+from backend.skill_matcher import get_matcher
+from metrics import stage
+def _unpack(blobs, n):
+    """(len(blobs), n) bool matrix of little-endian bitsets."""
+    nbytes = (n + 7) // 8
+    buf = np.frombuffer(b''.join((b or b'').ljust(nbytes, b'\0') for b in blobs), dtype=np.uint8).reshape(len(blobs), nbytes)
+    return np.unpackbits(buf, axis=1, count=n, bitorder='little').astype(bool)
+def _pack(row): return np.packbits(row, bitorder='little').tobytes()
+def _rematch(rows, skills):
+    """Matched-skill matrix over ``skills`` for evaluations stored against another skill
+    list: skills both lists share are copied from the stored bitsets, and only the new
+    ones are matched against the resume text."""
+    col = {sk: j for j, sk in enumerate(skills)}; bits = np.zeros((len(rows), len(skills)), dtype=bool)
+    groups = {}
+    for i, r in enumerate(rows): groups.setdefault(r['skills_hash'], []).append(i)
+    lists = get_skill_lists(h for h in groups if h)
+    for h, idx in groups.items():
+        old = lists.get(h, [])
+        shared = [(col[sk], j) for j, sk in enumerate(old) if sk in col]
+        if shared:
+            old_bits = _unpack([rows[i]['matched_bits'] for i in idx], len(old))
+            new_j, old_j = zip(*shared); bits[np.ix_(idx, new_j)] = old_bits[:, old_j]
+        have = set(old); new = [j for j, sk in enumerate(skills) if sk not in have]
+        if new:
+            matcher = get_matcher(tuple(normalize_text(skills[j]) for j in new))
+            texts = get_resume_texts({rows[i]['resume_id'] for i in idx})
+            hits = {rid: matcher.match(normalize_text(t or '')) for rid, t in texts.items()}  # once per resume, however often it was evaluated
+            for i in idx: bits[i, new] = hits.get(rows[i]['resume_id'], False)
+    return bits
+def rescore_job(job_id, profile, weights=WEIGHTS):
+    """Recompute score and verdict of every evaluation of a job from its stored components.
+
+    The semantic score is reused as stored. The hard-match score is reused too unless the
+    job's skill list changed since the evaluation (e.g. COMMON_SKILLS was edited); then
+    only the skills new to the list are matched against the resume. Evaluations without
+    stored components (details from before the breakdown existed) are skipped, and ones
+    scored against another JD text than the profile's (the job was edited since, or the
+    row predates jd_hash) are left alone and counted as stale: their semantic score no
+    longer holds, so they need a fresh /evaluate.
+    """
+    t = time.perf_counter()
+    skills = sorted(set(profile['skills'])); key = skills_key(skills)
+    rows = get_score_components(job_id); n = len(rows)
+    rows = [r for r in rows if r['semantic_score'] is not None and r['hard_score'] is not None]; m = len(rows)
+    rows = [r for r in rows if r['jd_hash'] == profile['jd_hash']]
+    out = {'job_id': job_id, 'evaluations': len(rows), 'updated': 0, 'rematched': 0, 'skipped': n - m, 'stale': m - len(rows)}
+    if not rows: return dict(out, elapsed_ms=0.0)
+    with stage('rescore'):
+        hard = np.array([r['hard_score'] for r in rows], dtype=float); sem = np.array([r['semantic_score'] for r in rows], dtype=float)
+        stale = np.flatnonzero([r['skills_hash'] != key for r in rows])
+        matched = _rematch([rows[i] for i in stale], skills) if stale.size else np.zeros((0, len(skills)), dtype=bool)
+        if stale.size: hard[stale] = 100.0 * matched.sum(axis=1) / len(skills) if skills else 0.0
+        score = weights[0] * hard + weights[1] * sem; verdict = verdict_for(score)
+        changed = np.zeros(len(rows), dtype=bool); changed[stale] = True
+        changed |= ~np.isclose(score, [r['score'] for r in rows], rtol=0, atol=1e-9) | (verdict != np.array([r['verdict'] for r in rows], dtype=object))
+    bits = {int(i): _pack(b) for i, b in zip(stale, matched)}
+    updates = [(float(score[i]), str(verdict[i]), float(hard[i]), key if i in bits else rows[i]['skills_hash'], bits.get(i, rows[i]['matched_bits']), rows[i]['id'])
+               for i in np.flatnonzero(changed).tolist()]
+    # keep the details' skill lists and hard score in step with the columns (JD order, as evaluation writes them)
+    details = []; stored = get_evaluation_details([rows[i]['id'] for i in stale]) if stale.size else {}
+    for i, b in zip(stale, matched):
+        d = stored.get(rows[i]['id'])
+        if d is None: continue
+        hit = set(np.asarray(skills, dtype=object)[b])
+        d['hard_matches'] = [sk for sk in profile['skills'] if sk in hit]; d['missing_skills'] = [sk for sk in profile['skills'] if sk not in hit]
+        d['breakdown'] = dict(d.get('breakdown') or {}, hard_score=float(hard[i])); details.append((d, rows[i]['id']))
+    with stage('db_write'): update_scores(updates, skills if stale.size else None, details)
+    return dict(out, updated=len(updates), rematched=int(stale.size), elapsed_ms=round(1e3 * (time.perf_counter() - t), 1))
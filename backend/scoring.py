@@ -1,8 +1,10 @@
 from backend.parsers import normalize_text
-from embeddings import get_embedding, cosine_similarity
-from fuzzywuzzy import fuzz
-import re
-from llm_feedback import generate_feedback_with_llm
+from embeddings import get_embedding, get_embeddings
+from backend.skill_matcher import get_matcher
+import re, json, hashlib
+import numpy as np
+from llm_feedback import generate_feedback_with_llm, cached_feedback, llm_enabled
+from metrics import stage, LLM_FALLBACKS
 COMMON_SKILLS = ['python','java','c++','react','node','sql','aws','docker','kubernetes','ml','django','flask','tensorflow','pytorch']
 def extract_skills_from_jd(jd_text):
     text = jd_text.lower(); skills=[]
@@ -11,39 +13,107 @@ def extract_skills_from_jd(jd_text):
     for f in COMMON_SKILLS:
         if f in text and f not in skills: skills.append(f)
     return list(dict.fromkeys(skills))
-def hard_match_score(resume_text, jd_text):
-    res_norm = normalize_text(resume_text); skills = extract_skills_from_jd(jd_text)
+PROFILE_VERSION = 2  # bump when the profile contents or their derivation change
+SKILLS_CONFIG = hashlib.sha256(json.dumps(COMMON_SKILLS).encode('utf-8')).hexdigest()[:16]  # profiles compiled with another COMMON_SKILLS are stale
+WEIGHTS = (0.6, 0.4)  # hard-match, semantic
+VERDICTS = ((75, "High"), (50, "Medium"))  # lowest score for each verdict, best first; anything below is "Low"
+def verdict_for(score):
+    """Verdict of a score, or an array of verdicts for an array of scores."""
+    s = np.asarray(score, dtype=float)
+    out = np.select([s >= lo for lo, _ in VERDICTS], [v for _, v in VERDICTS], "Low")
+    return out if out.ndim else str(out)
+def jd_hash(jd_text): return hashlib.sha256((jd_text or '').encode('utf-8')).hexdigest()
+# MiniLM truncates its input at 256 word pieces, so texts are embedded as sentence-packed chunks
+CHUNK_WORDS = 64; MAX_CHUNKS = 128; MAX_PHRASES = 32
+_SENTENCE = re.compile(r'(?<=[.!?])\s+|\s*\n\s*')
+_TOKEN = re.compile(r'[a-z0-9][a-z0-9+#]*')
+STOPWORDS = frozenset('a an and are as at be by for from in into is it of on or our the this to we will with you your'.split())
+def sentences(text):
+    return [' '.join(s.split()) for s in _SENTENCE.split(text or '') if s.strip()]
+def split_chunks(text, max_words=CHUNK_WORDS, max_chunks=MAX_CHUNKS):
+    """Consecutive sentences packed into chunks of at most ``max_words`` words; a blank
+    line (section break) always starts a new chunk and over-long sentences are cut."""
+    chunks=[]
+    for section in re.split(r'\n\s*\n', text or ''):
+        cur=[]
+        for sent in sentences(section):
+            words=sent.split()
+            for i in range(0, len(words), max_words):
+                piece=words[i:i+max_words]
+                if len(cur)+len(piece)>max_words: chunks.append(' '.join(cur)); cur=[]
+                cur+=piece
+        if cur: chunks.append(' '.join(cur))
+    return chunks[:max_chunks]
+def token_set(text): return set(_TOKEN.findall((text or '').lower()))
+def embed_resume(resume_text, embed_many=get_embeddings):
+    """(whole-text embedding, chunk embedding matrix), encoded as one batch."""
+    embs=np.asarray(embed_many([resume_text]+split_chunks(resume_text)), dtype=float)
+    return embs[0], embs[1:]
+def _jd_phrases(jd_text):
+    phrases = sentences(jd_text)[:MAX_PHRASES]
+    return {"phrases": phrases, "phrase_tokens": [sorted(token_set(p)-STOPWORDS) for p in phrases],
+            "phrase_embeddings": np.asarray(get_embeddings(phrases), dtype=float)}
+def compile_job_profile(jd_text, jd_embedding=None):
+    """Everything scoring needs from the JD side, computed once per job."""
+    skills = extract_skills_from_jd(jd_text)
+    return {"version": PROFILE_VERSION, "skills_config": SKILLS_CONFIG, "jd_hash": jd_hash(jd_text), "skills": skills, "skills_norm": [normalize_text(sk) for sk in skills],
+            **_jd_phrases(jd_text), "jd_embedding": get_embedding(jd_text) if jd_embedding is None else jd_embedding}
+def profile_is_current(profile, jd_hash_):
+    return bool(profile) and profile.get("version")==PROFILE_VERSION and profile.get("skills_config")==SKILLS_CONFIG and profile.get("jd_hash")==jd_hash_
+def profile_to_json(profile):
+    return json.dumps(dict(profile, jd_embedding=np.asarray(profile["jd_embedding"], dtype=float).tolist(),
+                           phrase_embeddings=np.asarray(profile["phrase_embeddings"], dtype=float).tolist()))
+def profile_from_json(s):
+    if not s: return None
+    p = json.loads(s); p["jd_embedding"] = np.asarray(p["jd_embedding"], dtype=float)
+    if "phrase_embeddings" in p: p["phrase_embeddings"] = np.asarray(p["phrase_embeddings"], dtype=float).reshape(len(p["phrases"]), -1 if p["phrases"] else 0)
+    return p
+def hard_match_score(resume_text, jd_text, profile=None):
+    res_norm = normalize_text(resume_text)
+    if profile: skills, skills_norm = profile["skills"], profile["skills_norm"]
+    else: skills = extract_skills_from_jd(jd_text); skills_norm = [normalize_text(sk) for sk in skills]
     matched=[]; missing=[]
-    for sk in skills:
-        sk_n = normalize_text(sk); ratio = fuzz.partial_ratio(sk_n, res_norm)
-        if sk_n in res_norm or ratio>=75: matched.append(sk)
+    for sk, hit in zip(skills, get_matcher(tuple(skills_norm)).match(res_norm)):
+        if hit: matched.append(sk)
         else: missing.append(sk)
     hard_score = 100.0*len(matched)/max(1,len(skills)) if skills else 0.0
     return hard_score, matched, missing
-def semantic_score(resume_text, jd_text):
-    e1 = get_embedding(resume_text); e2 = get_embedding(jd_text)
-    sim = cosine_similarity(e1,e2); score = max(0.0, min(100.0,(sim+1)/2*100))
-    phrases=[p.strip() for p in jd_text.split('.') if p.strip()][:8]; hits=[]
-    for p in phrases:
-        for w in p.split():
-            if w.lower() in resume_text.lower(): hits.append(p); break
-        if len(hits)>=5: break
+def _unit_rows(m):
+    m=np.atleast_2d(np.asarray(m, dtype=float)); return m/(np.linalg.norm(m, axis=1, keepdims=True)+1e-12)
+def semantic_score(resume_text, jd_text, profile=None, resume_chunk_embs=None, resume_tokens=None):
+    """Score from the JD-phrase x resume-chunk cosine matrix: each JD phrase takes its
+    best-matching resume chunk and the score is the mean of those. Hits are the JD
+    phrases sharing a non-stopword token with the resume, best-covered first."""
+    jd = profile or _jd_phrases(jd_text); phrases = jd["phrases"]
+    if resume_chunk_embs is None: resume_chunk_embs = get_embeddings(split_chunks(resume_text))
+    if not phrases or not len(resume_chunk_embs): return 0.0, []
+    best = _unit_rows(jd["phrase_embeddings"]).dot(_unit_rows(resume_chunk_embs).T).max(axis=1)
+    score = max(0.0, min(100.0, (float(best.mean())+1)/2*100))
+    tokens = token_set(resume_text) if resume_tokens is None else resume_tokens
+    hits = [phrases[i] for i in np.argsort(-best, kind='stable') if not tokens.isdisjoint(jd["phrase_tokens"][i])][:5]
     return score, hits
-def generate_feedback(missing_skills, matched, resume_text, jd_text):
-    fb = generate_feedback_with_llm(resume_text, jd_text, missing_skills, matched)
+def generate_feedback(missing_skills, matched, resume_text, jd_text, use_llm=True, profile=None, defer_llm=False):
+    # deferred: only a cached LLM answer is used now; the caller requests the rest in the background
+    if use_llm and defer_llm: fb = cached_feedback(resume_text, jd_text, missing_skills)
+    else: fb = generate_feedback_with_llm(resume_text, jd_text, missing_skills, matched) if use_llm else None
     if fb: return fb, True
     feedback=[]
     if missing_skills: feedback.append("Missing / weak skills: "+", ".join(missing_skills)); feedback.append("Recommendation: Add short projects...")
     else: feedback.append("All listed JD skills appear...")
-    if 'tensorflow' in jd_text.lower() and 'tensorflow' not in resume_text.lower(): feedback.append("If applying to ML roles...")
+    jd_mentions_tf = 'tensorflow' in profile["skills"] if profile else 'tensorflow' in jd_text.lower()
+    if jd_mentions_tf and 'tensorflow' not in resume_text.lower(): feedback.append("If applying to ML roles...")
     return feedback, False
-def evaluate_resume_for_jd(resume_text, jd_text, weights=(0.6,0.4)):
-    hard, matched, missing = hard_match_score(resume_text, jd_text)
-    sem, hits = semantic_score(resume_text, jd_text)
+def evaluate_resume_for_jd(resume_text, jd_text, weights=WEIGHTS, profile=None, resume_chunk_embs=None, use_llm=True, defer_llm=False):
+    with stage('hard_match'): hard, matched, missing = hard_match_score(resume_text, jd_text, profile)
+    with stage('semantic'): sem, hits = semantic_score(resume_text, jd_text, profile, resume_chunk_embs)
     final = weights[0]*hard + weights[1]*sem
-    verdict="Low"
-    if final>=75: verdict="High"
-    elif final>=50: verdict="Medium"
-    feedback, used = generate_feedback(missing, matched, resume_text, jd_text)
+    verdict = verdict_for(final)
+    with stage('feedback'): feedback, used = generate_feedback(missing, matched, resume_text, jd_text, use_llm, profile, defer_llm)
+    if use_llm and not defer_llm and not used: LLM_FALLBACKS.inc()
     details={"hard_matches": matched, "missing_skills": missing, "semantic_hits": hits, "breakdown":{"hard_score":hard,"semantic_score":sem}, "feedback":feedback, "llm_used": bool(used)}
+    if use_llm and defer_llm and not used and llm_enabled(): details["llm_pending"] = True
     return float(final), verdict, details
+def score_task(args):
+    """Process-pool entry point for bulk evaluation: (key, resume_text, jd_text, profile, resume_chunk_embs)."""
+    key, resume_text, jd_text, profile, resume_chunk_embs = args
+    return (key,)+evaluate_resume_for_jd(resume_text, jd_text, profile=profile, resume_chunk_embs=resume_chunk_embs, use_llm=False)
@@ -0,0 +1,45 @@
+import os, sqlite3
+from backend.db import fts_query, search_resumes, resume_snippets, get_resume_summaries
+from metrics import stage
+RRF_K = int(os.getenv('RRF_K', '60'))  # the usual constant: damps the weight of the very top ranks
+def rrf(*rankings, k=RRF_K):
+    """Reciprocal rank fusion: [(id, score), ...] best first, where each id scores
+    sum(1 / (k + rank)) over the rankings (lists of ids, best first) it appears in."""
+    scores = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking, 1): scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda x: -x[1])
+def hybrid_search(q, qvec, store, top_k=10, location=None, match_all=True, prefilter=True, candidates=1000):
+    """Resumes for the keywords ``q`` and the query embedding ``qvec``, BM25 and cosine
+    rankings merged with ``rrf``.
+
+    The keyword side takes the best ``candidates`` FTS5 hits. With ``prefilter``
+    the vector side only scores those hits (a filtered search over a few rows
+    instead of the whole store), so every result contains the keywords; without
+    it the vector side ranks the whole store and adds semantic matches the
+    keywords missed. The vector ranking is cut at ``max(100, 10 * top_k)``:
+    lower ranks add less than 1/(RRF_K + 100) each. Raises ValueError for a
+    query with no searchable terms.
+    """
+    match = fts_query(q, match_all)
+    if match is None: raise ValueError('the query has no searchable terms')
+    with stage('keyword_search'):
+        try: hits = search_resumes(match, candidates, location)
+        except sqlite3.OperationalError as ex: raise ValueError(f'bad query: {ex}')
+    where = {'location': location} if location else {}
+    if prefilter:
+        if not hits: return []
+        where['_id'] = [h['id'] for h in hits]
+    similar = store.search(qvec, top_k=max(100, 10 * top_k), where=where)
+    keyword = {h['id']: (rank, h) for rank, h in enumerate(hits, 1)}
+    vector = {m.get('resume_id'): (rank, s) for rank, (m, s) in enumerate(similar, 1)}
+    fused = rrf(list(keyword), list(vector))[:top_k]
+    rows = get_resume_summaries([id_ for id_, _ in fused]); snippets = resume_snippets(match, [id_ for id_, _ in fused if id_ in keyword]); out = []
+    for id_, score in fused:
+        r = rows.get(id_)
+        if r is None: continue  # deleted since it was indexed
+        kw = keyword.get(id_); vec = vector.get(id_)
+        out.append({'resume_id': id_, 'name': r['name'], 'email': r['email'], 'location': r['location'], 'score': score,
+                    'keyword_rank': kw[0] if kw else None, 'bm25': kw[1]['bm25'] if kw else None, 'snippet': snippets.get(id_),
+                    'vector_rank': vec[0] if vec else None, 'similarity': vec[1] if vec else None})
+    return out
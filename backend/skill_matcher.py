@@ -0,0 +1,28 @@
+import functools
+
+class SkillMatcher:
+    """Matches a fixed list of normalized skills against normalized resume text.
+
+    Gives exactly what ``sk in text or fuzz.partial_ratio(sk, text) >= threshold``
+    gives for every skill, with less work:
+
+    * each distinct skill is matched once, however often the JD lists it;
+    * the exact tier is a substring search, and the fuzzy scan over the
+      whole text only runs for skills the exact tier did not find (the old
+      loop ran ``partial_ratio`` for every skill, hits included).
+    """
+    def __init__(self, skills, threshold=75):
+        from fuzzywuzzy import fuzz  # deferred: slow to import, unused until the first match
+        self.skills = list(skills); self.threshold = threshold; self._partial_ratio = fuzz.partial_ratio
+        self._distinct = list(dict.fromkeys(self.skills))
+    def match(self, text):
+        """Return one bool per skill, in order."""
+        hits = {}
+        for s in self._distinct:
+            hits[s] = s in text or self._partial_ratio(s, text) >= self.threshold
+        return [hits[s] for s in self.skills]
+
+@functools.lru_cache(maxsize=256)
+def get_matcher(skills_norm, threshold=75):
+    """Shared matcher for a tuple of normalized skills (one per job profile)."""
+    return SkillMatcher(skills_norm, threshold)
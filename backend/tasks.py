@@ -0,0 +1,65 @@
+import os, uuid, socket, threading, time, json, logging, traceback
+from backend.db import enqueue_task, claim_task, finish_task, fail_task, renew_task_leases, requeue_expired_tasks, get_task
+logger = logging.getLogger(__name__)
+PRIORITY_INTERACTIVE = 10
+PRIORITY_BULK = 0
+TASK_LEASE_S = float(os.getenv('TASK_LEASE_S', '60'))
+class TaskQueue:
+    """SQLite-backed job queue drained by a pool of worker threads.
+
+    Tasks are rows in the ``tasks`` table, so they survive restarts. A claimed
+    task is leased to this queue for ``lease_s`` seconds and the lease is renewed
+    while the process lives, so several processes (``uvicorn --workers N``) can
+    share the table; tasks whose lease ran out (their process died) are re-queued.
+    Workers pick the highest ``priority`` first and retry failures with
+    exponential backoff until ``max_attempts`` is reached. Errors with a 4xx
+    ``status_code`` (a deleted resume or job) fail at once.
+    """
+    def __init__(self, handlers, workers=2, poll_interval=0.5, retry_backoff=2.0, lease_s=TASK_LEASE_S):
+        self.handlers = handlers; self.workers = max(1, int(workers)); self.poll_interval = poll_interval; self.retry_backoff = retry_backoff
+        self.lease_s = lease_s; self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._wake = threading.Event(); self._stop = threading.Event(); self._threads = []
+    def start(self):
+        if self._threads: return
+        self._stop.clear()
+        t = threading.Thread(target=self._heartbeat, name='task-leases', daemon=True); t.start(); self._threads.append(t)
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f'task-worker-{i}', daemon=True); t.start(); self._threads.append(t)
+    def stop(self, timeout=5.0):
+        self._stop.set(); self._wake.set()
+        for t in self._threads: t.join(timeout)
+        self._threads = []
+    def alive_workers(self): return sum(t.is_alive() for t in self._threads[1:])
+    def submit(self, kind, payload, priority=PRIORITY_INTERACTIVE, max_attempts=3):
+        if kind not in self.handlers: raise ValueError(f"unknown task kind: {kind}")
+        tid = enqueue_task(kind, payload, priority, max_attempts); self._wake.set(); return tid
+    def status(self, task_id):
+        row = get_task(task_id)
+        if row is None: return None
+        out = dict(row); out['payload'] = json.loads(out['payload'] or 'null'); out['result'] = json.loads(out['result']) if out['result'] else None
+        return out
+    def _heartbeat(self):
+        while True:
+            try:
+                renew_task_leases(self.owner, time.time() + self.lease_s)
+                n = requeue_expired_tasks(time.time())
+                if n: logger.info("re-queued %d tasks with expired leases", n); self._wake.set()
+            except Exception:
+                logger.exception("renewing task leases failed")
+            if self._stop.wait(self.lease_s / 3): return
+    def _run(self):
+        while not self._stop.is_set():
+            try: task = claim_task(time.time(), self.owner, self.lease_s)
+            except Exception:
+                logger.exception("claiming a task failed"); task = None
+            if task is None:
+                self._wake.wait(self.poll_interval); self._wake.clear(); continue
+            try:
+                result = self.handlers[task['kind']](**json.loads(task['payload'] or '{}'))
+                finish_task(task['id'], result, self.owner)
+            except Exception as ex:
+                attempts = task['attempts'] + 1  # claim_task incremented the stored count
+                permanent = 400 <= getattr(ex, 'status_code', 500) < 500  # retrying will not bring a deleted row back
+                retry_at = time.time() + self.retry_backoff ** attempts if attempts < task['max_attempts'] and not permanent else None
+                logger.warning("task %s (%s) failed on attempt %d: %s", task['id'], task['kind'], attempts, ex)
+                fail_task(task['id'], ''.join(traceback.format_exception_only(type(ex), ex)).strip(), self.owner, retry_at)
@@ -0,0 +1,45 @@
+import json, threading, multiprocessing
+class Lazy:
+    """A shared object (a worker or connection pool) built by ``factory`` on first ``get``.
+
+    ``stale(obj)`` is checked on every ``get`` and rebuilds the object when true
+    (a forked child must not reuse its parent's pool). ``reset`` drops it, so
+    the next ``get`` builds a fresh one.
+    """
+    def __init__(self, factory, stale=None):
+        self.factory = factory; self.stale = stale; self.obj = None; self.lock = threading.Lock()
+    def get(self):
+        with self.lock:
+            if self.obj is None or (self.stale and self.stale(self.obj)): self.obj = self.factory()
+            return self.obj
+    def peek(self): return self.obj
+    def close(self, fn):
+        """Drop the object and hand it to ``fn`` (a pool's shutdown), if it was ever built."""
+        with self.lock: obj, self.obj = self.obj, None
+        if obj is not None: fn(obj)
+    def reset(self, obj=None):
+        """Drop the object (only if it is still ``obj``, when given); returns whether it was dropped."""
+        with self.lock:
+            if self.obj is None or (obj is not None and self.obj is not obj): return False
+            self.obj = None; return True
+def mp_context():
+    # the API process runs threads (batcher, task workers, LLM loop); a child forked while one
+    # of them holds a lock can deadlock, so worker processes start from a clean interpreter
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+def ndjson(obj): return json.dumps(obj) + "\n"
+def chunked(items, n):
+    chunk = []
+    for x in items:
+        chunk.append(x)
+        if len(chunk) >= n: yield chunk; chunk = []
+    if chunk: yield chunk
+def pipelined(chunks, submit, drain):
+    """Yield ``drain(submit(chunk))`` for every chunk, submitting the next chunk before
+    draining the previous one: its work runs while the previous results are written."""
+    pending = None
+    for chunk in chunks:
+        nxt = submit(chunk)
+        if pending is not None: yield drain(pending)
+        pending = nxt
+    if pending is not None: yield drain(pending)
@@ -0,0 +1,12 @@
+"""Benchmarks for JobSync. Each module runs as a script: ``python -m benchmarks.<name> --help``.
+
+    corpus          deterministic synthetic resumes/JDs (text, PDF, DOCX)
+    suite           microbenchmarks + in-process API load test, baseline comparison
+    ann_recall      IVF index recall and QPS against the exact scan
+    quantization    float16/int8 vector storage: memory, QPS and recall against float32
+    skill_matching  SkillMatcher against the per-skill fuzzy scan
+    hybrid_search   FTS5 keyword + vector search fused with RRF, prefiltered and not
+    bulk_ingest     one upload per resume against a ZIP to /resumes/bulk
+    startup         import time and time to first response
+    llm_standin     local chat-completions server and LLM client load test
+"""
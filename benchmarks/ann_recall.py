@@ -0,0 +1,49 @@
+"""Recall@k and query throughput of the IVF index against the exact scan.
+
+    python -m benchmarks.ann_recall --n 20000 --queries 200 --k 10
+
+Data is synthetic: 384-dim unit vectors drawn around random cluster centres,
+which is closer to sentence embeddings than isotropic noise.
+"""
+import argparse, os, sys, tempfile, time
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vectorstore import SimpleVectorStore
+
+def synthetic(n, dim=384, clusters=200, spread=2.0, seed=0):
+    rng=np.random.default_rng(seed)
+    centres=rng.standard_normal((clusters, dim))
+    X=centres[rng.integers(0, clusters, n)]+spread*rng.standard_normal((n, dim))
+    return X.astype(np.float32)
+
+def build(path, X, **kw):
+    store=SimpleVectorStore(path=path, dim=X.shape[1], buffer_size=4096, background_compaction=False, **kw)
+    for i, x in enumerate(X): store.add(x, {'i': i})
+    store.flush(); return store
+
+def timed_search(store, Q, k, **kw):
+    store.search(Q[0], top_k=k, **kw)  # warm-up
+    t=time.perf_counter(); res=[[m['i'] for m, _ in store.search(q, top_k=k, **kw)] for q in Q]
+    return res, len(Q)/(time.perf_counter()-t)
+
+def main():
+    ap=argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--n', type=int, default=20000); ap.add_argument('--queries', type=int, default=200)
+    ap.add_argument('--k', type=int, default=10); ap.add_argument('--nlist', type=int, default=128)
+    ap.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    args=ap.parse_args()
+    X=synthetic(args.n+args.queries); X, Q=X[:args.n], X[args.n:]
+    with tempfile.TemporaryDirectory() as tmp:
+        exact=build(os.path.join(tmp, 'exact'), X)
+        truth, qps=timed_search(exact, Q, args.k)
+        print(f'exact scan: n={args.n} k={args.k} qps={qps:.0f}')
+        t=time.perf_counter(); ivf=build(os.path.join(tmp, 'ivf'), X, index='ivf', nlist=args.nlist)
+        print(f'ivf build: nlist={ivf.index.nlist} {time.perf_counter()-t:.1f}s')
+        for nprobe in args.nprobe:
+            res, qps=timed_search(ivf, Q, args.k, nprobe=nprobe)
+            recall=np.mean([len(set(a)&set(b))/len(b) for a, b in zip(res, truth)])
+            print(f'nprobe={nprobe:<4d} recall@{args.k}={recall:.3f} qps={qps:.0f}')
+        exact.close(); ivf.close()
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Ingest throughput: one POST /resumes per file against one POST /resumes/bulk with a
+ZIP of the same number of files.
+
+    python -m benchmarks.bulk_ingest --n 500 --format pdf
+
+Each path gets its own corpus (a different seed) so neither finds the other's
+documents in the parsed-text cache. Runs in-process against a throwaway database.
+"""
+import argparse, asyncio, io, json, os, sys, tempfile, time, zipfile
+WORKDIR = tempfile.mkdtemp(prefix='jobsync-ingest-')
+os.environ.update(JOBSYNC_DB_PATH=os.path.join(WORKDIR, 'data.db'), EMBED_CACHE_PATH=os.path.join(WORKDIR, 'embeddings.sqlite'),
+                  LLM_CACHE_PATH='', WARMUP_ON_STARTUP='0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.corpus import generate, render
+
+def files(n, fmt, words, seed):
+    return [(f'r{i}{suffix}', data, ctype) for i, r in enumerate(generate(n, 1, words, seed)['resumes']) for data, suffix, ctype in [render(r['text'], fmt)]]
+
+async def run(args):
+    import httpx
+    from backend.main import app
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench', timeout=None) as c:
+        single = files(args.n, args.format, args.words, 1); sem = asyncio.Semaphore(args.clients)
+        async def post(f):
+            async with sem: (await c.post('/resumes', data={'location': 'Pune'}, files={'file': f})).raise_for_status()
+        t = time.perf_counter(); await asyncio.gather(*map(post, single)); one = time.perf_counter() - t
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for name, data, _ in files(args.n, args.format, args.words, 2): zf.writestr(name, data)
+        t = time.perf_counter()
+        r = await c.post('/resumes/bulk', data={'location': 'Pune'}, files={'files': ('batch.zip', buf.getvalue(), 'application/zip')})
+        bulk = time.perf_counter() - t; done = json.loads(r.text.splitlines()[-1])
+    print(f"{'path':<28}{'files':>7}{'seconds':>10}{'files/s':>10}")
+    print(f"{f'POST /resumes x{args.clients}':<28}{args.n:>7}{one:>10.2f}{args.n / one:>10.1f}")
+    print(f"{'POST /resumes/bulk (zip)':<28}{done['added']:>7}{bulk:>10.2f}{args.n / bulk:>10.1f}")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--n', type=int, default=200); ap.add_argument('--format', choices=['txt', 'pdf', 'docx'], default='pdf')
+    ap.add_argument('--words', type=int, default=300); ap.add_argument('--clients', type=int, default=16, help='concurrent single uploads')
+    args = ap.parse_args()
+    cwd = os.getcwd(); os.chdir(WORKDIR)
+    try: asyncio.run(run(args))
+    finally: os.chdir(cwd)
+
+if __name__ == '__main__':
+    main()
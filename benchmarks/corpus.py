@@ -0,0 +1,93 @@
+"""Deterministic synthetic resumes and job descriptions, as text, PDF or DOCX.
+
+    python -m benchmarks.corpus --resumes 500 --jds 20 --format pdf --out /tmp/corpus
+
+The same seed always gives the same corpus, so timings from different commits
+are comparable. PDFs are written by a small built-in writer (one Helvetica text
+stream per page), so no PDF library is needed to generate them.
+"""
+import argparse, io, os, random
+
+SKILLS = ['python', 'java', 'c++', 'react', 'node', 'sql', 'aws', 'docker', 'kubernetes', 'ml', 'django', 'flask',
+          'tensorflow', 'pytorch', 'pandas', 'numpy', 'spark', 'kafka', 'redis', 'postgresql', 'mongodb', 'graphql',
+          'typescript', 'golang', 'rust', 'terraform', 'linux', 'git', 'fastapi', 'scikit-learn']
+FIRST = ['Aarav', 'Diya', 'Ishaan', 'Meera', 'Kabir', 'Ananya', 'Rohan', 'Sara', 'Vikram', 'Priya', 'Arjun', 'Nisha']
+LAST = ['Sharma', 'Patel', 'Iyer', 'Gupta', 'Reddy', 'Singh', 'Khan', 'Das', 'Menon', 'Joshi']
+LOCATIONS = ['Pune', 'Bengaluru', 'Hyderabad', 'Delhi', 'Mumbai', 'Chennai', 'Remote']
+TITLES = ['Backend Engineer', 'Data Scientist', 'ML Engineer', 'Full Stack Developer', 'DevOps Engineer', 'Data Engineer']
+VERBS = ['built', 'designed', 'maintained', 'optimised', 'migrated', 'deployed', 'tested', 'led', 'automated']
+DUTIES = ['build', 'design', 'maintain', 'optimise', 'own', 'scale', 'test']
+OBJECTS = ['a payments service', 'the reporting pipeline', 'an internal dashboard', 'a recommendation model',
+           'the CI workflow', 'a REST API', 'the data warehouse', 'a chat bot', 'the mobile backend']
+FILLER = ['team', 'users', 'latency', 'reliability', 'customers', 'scale', 'quality', 'features', 'deadlines', 'reviews']
+
+def make_resume(rng, words=300):
+    name = f'{rng.choice(FIRST)} {rng.choice(LAST)}'
+    email = name.lower().replace(' ', '.') + f'{rng.randrange(100)}@example.com'
+    location = rng.choice(LOCATIONS); skills = rng.sample(SKILLS, rng.randint(4, 10))
+    lines = [name, email, location, '', 'Skills: ' + ', '.join(skills), '', 'Experience']
+    n = 0
+    while n < words:
+        s = f'{rng.choice(VERBS).capitalize()} {rng.choice(OBJECTS)} using {rng.choice(skills)} for {rng.choice(FILLER)} and {rng.choice(FILLER)}.'
+        lines.append(s); n += len(s.split())
+    return {'name': name, 'email': email, 'location': location, 'text': '\n'.join(lines)}
+
+def make_jd(rng, n_skills=8):
+    title = rng.choice(TITLES); skills = rng.sample(SKILLS, n_skills)
+    duties = [f'You will {rng.choice(DUTIES)} {rng.choice(OBJECTS)} with {rng.choice(skills)}.' for _ in range(6)]
+    text = '\n'.join([title, '', 'Requirements: ' + ', '.join(skills), ''] + duties + ['', f'Location: {rng.choice(LOCATIONS)}'])
+    return {'title': title, 'location': rng.choice(LOCATIONS), 'text': text}
+
+def generate(resumes=100, jds=5, words=300, seed=0):
+    """{'resumes': [{name, email, location, text}], 'jds': [{title, location, text}]}"""
+    rng = random.Random(seed)
+    return {'resumes': [make_resume(rng, words) for _ in range(resumes)], 'jds': [make_jd(rng) for _ in range(jds)]}
+
+def _pdf_string(line):
+    return line.encode('latin-1', 'replace').decode('latin-1').replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def to_pdf(text, lines_per_page=48):
+    lines = text.split('\n'); pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    n = len(pages); font = 3 + 2 * n
+    objs = ['<< /Type /Catalog /Pages 2 0 R >>', f'<< /Type /Pages /Kids [{" ".join(f"{3 + 2 * i} 0 R" for i in range(n))}] /Count {n} >>']
+    for i, page in enumerate(pages):
+        stream = 'BT /F1 10 Tf 50 760 Td 14 TL ' + ' '.join(f"({_pdf_string(l)}) '" for l in page) + ' ET'
+        objs.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 {font} 0 R >> >> /Contents {4 + 2 * i} 0 R >>')
+        objs.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+    objs.append('<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+    out = '%PDF-1.4\n'; offsets = []
+    for i, o in enumerate(objs):
+        offsets.append(len(out)); out += f'{i + 1} 0 obj\n{o}\nendobj\n'
+    xref = len(out)
+    out += f'xref\n0 {len(objs) + 1}\n0000000000 65535 f \n' + ''.join(f'{o:010d} 00000 n \n' for o in offsets)
+    out += f'trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'
+    return out.encode('latin-1')
+
+def to_docx(text):
+    import docx
+    doc = docx.Document()
+    for line in text.split('\n'): doc.add_paragraph(line)
+    buf = io.BytesIO(); doc.save(buf); return buf.getvalue()
+
+def render(text, fmt):
+    """(bytes, filename suffix, content type) for 'txt', 'pdf' or 'docx'."""
+    if fmt == 'pdf': return to_pdf(text), '.pdf', 'application/pdf'
+    if fmt == 'docx': return to_docx(text), '.docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+    return text.encode('utf-8'), '.txt', 'text/plain'
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--resumes', type=int, default=100); ap.add_argument('--jds', type=int, default=5)
+    ap.add_argument('--words', type=int, default=300); ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--format', choices=['txt', 'pdf', 'docx'], default='txt'); ap.add_argument('--out', required=True)
+    args = ap.parse_args()
+    corpus = generate(args.resumes, args.jds, args.words, args.seed)
+    for kind, items in (('resume', corpus['resumes']), ('jd', corpus['jds'])):
+        os.makedirs(os.path.join(args.out, kind + 's'), exist_ok=True)
+        for i, item in enumerate(items):
+            data, suffix, _ = render(item['text'], args.format)
+            with open(os.path.join(args.out, kind + 's', f'{kind}_{i:05d}{suffix}'), 'wb') as f: f.write(data)
+    print(f"wrote {len(corpus['resumes'])} resumes and {len(corpus['jds'])} JDs to {args.out}")
+
+if __name__ == '__main__':
+    main()
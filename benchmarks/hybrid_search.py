@@ -0,0 +1,52 @@
+"""Latency of /search's hybrid ranking: FTS5 keyword query, vector search prefiltered to
+the keyword hits, and the same fused with a full vector scan.
+
+    python -m benchmarks.hybrid_search --n 100000 --queries 100
+
+Resumes come from benchmarks.corpus and go into a throwaway database; their
+vectors are random (ranking quality is not measured here, only cost).
+"""
+import argparse, os, sys, tempfile, time
+WORKDIR = tempfile.mkdtemp(prefix='jobsync-hybrid-')
+os.environ['JOBSYNC_DB_PATH'] = os.path.join(WORKDIR, 'data.db')  # read by backend.db at import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import random
+import numpy as np
+from benchmarks.corpus import generate, SKILLS
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--n', type=int, default=20000); ap.add_argument('--queries', type=int, default=100)
+    ap.add_argument('--words', type=int, default=120); ap.add_argument('--top-k', type=int, default=10)
+    args = ap.parse_args()
+    from backend.db import init_db, add_resumes, fts_query, search_resumes
+    from backend.search import hybrid_search
+    from vectorstore import SimpleVectorStore
+    init_db(); t = time.perf_counter()
+    corpus = generate(args.n, 1, args.words)['resumes']
+    ids = []
+    for i in range(0, len(corpus), 5000): ids += add_resumes([(r['name'], r['email'], r['location'], r['text']) for r in corpus[i:i + 5000]])
+    store = SimpleVectorStore(os.path.join(WORKDIR, 'store'), buffer_size=4096, background_compaction=False)
+    vecs = np.random.default_rng(0).standard_normal((len(ids), 384)).astype(np.float32)
+    for id_, v, r in zip(ids, vecs, corpus): store.upsert(id_, v, {'resume_id': id_, 'location': r['location']})
+    store.flush(); print(f'indexed {len(ids)} resumes in {time.perf_counter() - t:.1f}s')
+    rng = random.Random(1)
+    queries = [' '.join(rng.sample(SKILLS, 3)) for _ in range(args.queries)]
+    qvecs = np.random.default_rng(1).standard_normal((args.queries, 384)).astype(np.float32)
+    def run(fn):
+        lat = []
+        for i, q in enumerate(queries):
+            t = time.perf_counter(); fn(i, q); lat.append(time.perf_counter() - t)
+        return {'p50_ms': 1e3 * float(np.percentile(lat, 50)), 'p95_ms': 1e3 * float(np.percentile(lat, 95))}
+    hits = [len(search_resumes(fts_query(q), 10 ** 9)) for q in queries]
+    print(f'keyword hits per query: median {int(np.median(hits))} of {len(ids)}')
+    results = {'fts5 keyword (1000 best)': run(lambda i, q: search_resumes(fts_query(q), 1000)),
+               'hybrid, prefiltered': run(lambda i, q: hybrid_search(q, qvecs[i], store, args.top_k)),
+               'hybrid, full vector scan': run(lambda i, q: hybrid_search(q, qvecs[i], store, args.top_k, prefilter=False)),
+               'vector only': run(lambda i, q: store.search(qvecs[i], args.top_k))}
+    print(f"{'benchmark':<28}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, r in results.items(): print(f"{name:<28}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}")
+    store.close()
+
+if __name__ == '__main__':
+    main()
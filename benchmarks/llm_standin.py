@@ -0,0 +1,84 @@
+"""Local stand-in for the chat-completions API, and a load test of llm_feedback against it.
+
+    python -m benchmarks.llm_standin --requests 40 --delay 0.2 --concurrency 4
+    python -m benchmarks.llm_standin --serve --port 8089   # just the server
+
+The server answers POST /v1/chat/completions after --delay seconds with a fixed
+bullet list and records how many requests it had in flight at once. The load
+test points llm_feedback at it (OPENAI_BASE_URL), fires --requests distinct
+feedback calls from a thread pool, then repeats them to exercise the cache, and
+finally checks that a server slower than LLM_TIMEOUT_S degrades to None.
+"""
+import argparse, json, os, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class StandIn(ThreadingHTTPServer):
+    daemon_threads = True
+    def __init__(self, port=0, delay=0.1):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.delay = delay; self.lock = threading.Lock(); self.in_flight = 0; self.max_in_flight = 0; self.requests = 0
+    @property
+    def base_url(self): return f'http://127.0.0.1:{self.server_address[1]}/v1'
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so the client's connection pool is exercised
+    def log_message(self, *args): pass
+    def do_POST(self):
+        srv = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with srv.lock:
+            srv.requests += 1; srv.in_flight += 1; srv.max_in_flight = max(srv.max_in_flight, srv.in_flight)
+        try:
+            time.sleep(srv.delay)
+            if not self.path.endswith('/chat/completions'):
+                self.send_response(404); self.send_header('Content-Length', '0'); self.end_headers(); return
+            content = "- Add a project using Docker\n- Learn AWS basics\n1. Quantify results on your resume"
+            out = json.dumps({'id': 'chatcmpl-standin', 'object': 'chat.completion', 'created': int(time.time()), 'model': body.get('model', ''),
+                              'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                              'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}}).encode()
+            self.send_response(200); self.send_header('Content-Type', 'application/json'); self.send_header('Content-Length', str(len(out)))
+            self.end_headers(); self.wfile.write(out)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up (timeout)
+        finally:
+            with srv.lock: srv.in_flight -= 1
+
+def start(port=0, delay=0.1):
+    srv = StandIn(port, delay); threading.Thread(target=srv.serve_forever, daemon=True).start(); return srv
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--serve', action='store_true'); ap.add_argument('--port', type=int, default=0)
+    ap.add_argument('--requests', type=int, default=40); ap.add_argument('--delay', type=float, default=0.2)
+    ap.add_argument('--concurrency', type=int, default=4); ap.add_argument('--timeout', type=float, default=2.0)
+    args = ap.parse_args()
+    srv = start(args.port, args.delay)
+    if args.serve:
+        print(f'serving on {srv.base_url}'); threading.Event().wait(); return
+    # llm_feedback reads its settings at import time
+    os.environ.update(OPENAI_API_KEY='standin', OPENAI_BASE_URL=srv.base_url, LLM_CACHE_PATH='',
+                      LLM_CONCURRENCY=str(args.concurrency), LLM_TIMEOUT_S=str(args.timeout))
+    import llm_feedback as lf
+    calls = [(f'Resume {i}: python developer', 'Requirements: python, docker, aws', ['docker', 'aws']) for i in range(args.requests)]
+    def run():
+        t = time.perf_counter()
+        with ThreadPoolExecutor(32) as ex: out = list(ex.map(lambda c: lf.generate_feedback_with_llm(c[0], c[1], c[2], []), calls))
+        return time.perf_counter() - t, out
+    lf.generate_feedback_with_llm('warm-up', 'jd', [], [])  # SDK import and client construction
+    srv.max_in_flight = 0
+    cold, out = run()
+    print(f'cold   {args.requests} calls in {cold:.2f}s (ideal {args.requests * args.delay / args.concurrency:.2f}s), '
+          f'server max in flight {srv.max_in_flight} (limit {args.concurrency}), ok={sum(o is not None for o in out)}')
+    served = srv.requests; warm, out = run()
+    print(f'cached {args.requests} calls in {warm * 1e3:.1f}ms, server requests {srv.requests - served}, ok={sum(o is not None for o in out)}')
+    srv.delay = args.timeout + 1.0
+    t = time.perf_counter(); slow = lf.generate_feedback_with_llm('never seen before', 'jd', [], [])
+    print(f'slow server: returned {slow!r} after {time.perf_counter() - t:.2f}s (timeout {args.timeout}s)')
+    print('stats', lf.llm_stats())
+    ok = srv.max_in_flight <= args.concurrency and srv.requests - served == 0 and slow is None
+    srv.shutdown(); sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
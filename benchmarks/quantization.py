@@ -0,0 +1,39 @@
+"""Memory, query throughput and recall@k of float16/int8 vector storage against float32.
+
+    python -m benchmarks.quantization --n 50000 --queries 200 --k 10 --rerank 1 2 4 8
+
+Memory is what a full scan reads (SimpleVectorStore.scan_bytes); recall is
+against the float32 store's results. ``rerank`` is the shortlist size in
+multiples of k that is re-scored against the float32 rows, so ``--rerank 1``
+shows the recall of the compact scan alone. float16 halves memory and nothing
+else: numpy has no half-precision matrix product, so its rows are widened block
+by block and searches run about 12x slower than float32. int8 keeps close to
+float32 speed at a quarter of the memory.
+"""
+import argparse, os, sys, tempfile
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.ann_recall import synthetic, build, timed_search
+
+def main():
+    ap=argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--n', type=int, default=50000); ap.add_argument('--queries', type=int, default=200)
+    ap.add_argument('--k', type=int, default=10); ap.add_argument('--rerank', type=int, nargs='+', default=[1, 2, 4, 8])
+    args=ap.parse_args()
+    X=synthetic(args.n+args.queries); X, Q=X[:args.n], X[args.n:]
+    with tempfile.TemporaryDirectory() as tmp:
+        exact=build(os.path.join(tmp, 'float32'), X)
+        truth, qps=timed_search(exact, Q, args.k)
+        print(f"{'dtype':<9}{'rerank':>7}{'scan MiB':>10}{'qps':>8}{'recall@'+str(args.k):>11}")
+        print(f"{'float32':<9}{'-':>7}{exact.scan_bytes()/2**20:>10.1f}{qps:>8.0f}{1.0:>11.3f}")
+        for dtype in ('float16', 'int8'):
+            store=build(os.path.join(tmp, dtype), X, dtype=dtype)
+            for rerank in args.rerank:
+                store.rerank=rerank; res, qps=timed_search(store, Q, args.k)
+                recall=np.mean([len(set(a)&set(b))/len(b) for a, b in zip(res, truth)])
+                print(f"{dtype:<9}{rerank:>7d}{store.scan_bytes()/2**20:>10.1f}{qps:>8.0f}{recall:>11.3f}")
+            store.close()
+        exact.close()
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Compare the SkillMatcher-based hard_match_score with the per-skill fuzzy scan it replaced.
+
+    python -m benchmarks.skill_matching --resumes 200 --words 2000
+
+Checks that matched/missing lists are identical for every (resume, JD) pair and
+reports the time per pair for both implementations.
+"""
+import argparse, os, random, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fuzzywuzzy import fuzz
+from backend.parsers import normalize_text
+from backend.scoring import extract_skills_from_jd, hard_match_score
+
+def legacy_hard_match_score(resume_text, jd_text):
+    # hard_match_score as it was before SkillMatcher
+    res_norm = normalize_text(resume_text); skills = extract_skills_from_jd(jd_text)
+    matched=[]; missing=[]
+    for sk in skills:
+        sk_n = normalize_text(sk); ratio = fuzz.partial_ratio(sk_n, res_norm)
+        if sk_n in res_norm or ratio>=75: matched.append(sk)
+        else: missing.append(sk)
+    hard_score = 100.0*len(matched)/max(1,len(skills)) if skills else 0.0
+    return hard_score, matched, missing
+
+SKILLS = ['python', 'java', 'javascript', 'typescript', 'c++', 'react', 'node.js', 'sql', 'postgresql', 'aws', 'docker',
+          'kubernetes', 'terraform', 'django', 'flask', 'fastapi', 'tensorflow', 'pytorch', 'scikit-learn', 'pandas',
+          'spark', 'kafka', 'redis', 'graphql', 'ci/cd', 'git', 'linux', 'machine learning', 'nlp', 'computer vision']
+FILLER = ('worked on team project built deployed service improved latency customer data pipeline designed '
+          'implemented tested maintained led migrated analysis dashboard reporting internal tooling').split()
+
+def typo(rng, w):
+    if len(w) < 4: return w
+    i = rng.randrange(len(w)); return w[:i] + rng.choice('aeiourstn') + w[i+1:]
+
+def make_resume(rng, words):
+    out = []
+    for _ in range(words):
+        r = rng.random()
+        out.append(rng.choice(SKILLS) if r < 0.03 else typo(rng, rng.choice(SKILLS)) if r < 0.05 else rng.choice(FILLER))
+    return ' '.join(out)
+
+def make_jd(rng, n_skills):
+    return 'Senior Engineer.\nRequirements: ' + ', '.join(rng.sample(SKILLS, n_skills)) + '\nWe value ownership.'
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--resumes', type=int, default=200); ap.add_argument('--words', type=int, default=2000)
+    ap.add_argument('--jds', type=int, default=5); ap.add_argument('--skills', type=int, default=20)
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args(); rng = random.Random(args.seed)
+    resumes = [make_resume(rng, args.words) for _ in range(args.resumes)]
+    jds = [make_jd(rng, args.skills) for _ in range(args.jds)]
+    pairs = [(r, j) for j in jds for r in resumes]
+    t = time.perf_counter(); old = [legacy_hard_match_score(r, j) for r, j in pairs]; t_old = time.perf_counter() - t
+    t = time.perf_counter(); new = [hard_match_score(r, j) for r, j in pairs]; t_new = time.perf_counter() - t
+    mismatches = sum(a != b for a, b in zip(old, new))
+    print(f'pairs={len(pairs)} resume_words={args.words} jd_skills={args.skills}')
+    print(f'legacy      {1e3*t_old/len(pairs):8.3f} ms/pair')
+    print(f'SkillMatcher {1e3*t_new/len(pairs):7.3f} ms/pair  ({t_old/t_new:.1f}x)')
+    print(f'mismatches={mismatches}')
+    if mismatches: sys.exit(1)
+
+if __name__ == '__main__':
+    main()
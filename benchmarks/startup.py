@@ -0,0 +1,88 @@
+"""Measure backend cold start: import time of backend.main and time to first response.
+
+    python -m benchmarks.startup --save benchmarks/startup_baseline.json
+    python -m benchmarks.startup --compare benchmarks/startup_baseline.json
+
+Runs ``python -X importtime -c 'import backend.main'`` and reports the total and
+the slowest top-level imports, then starts uvicorn on a free port and times
+/healthz answering, POST /warmup and /readyz turning 200. With --compare, exits
+non-zero when a metric regresses by more than --tolerance over the saved run.
+"""
+import argparse, json, os, re, socket, subprocess, sys, tempfile, time, urllib.request, urllib.error
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+def import_times(runs=3):
+    """Best-of-``runs`` cumulative import time of backend.main, plus the heaviest direct imports."""
+    best = None
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import backend.main'], cwd=WORKDIR, env=_env(),
+                             capture_output=True, text=True, check=True).stderr
+        rows = [(int(cum), len(indent), name) for _, cum, indent, name in IMPORT_LINE.findall(out)]
+        total = next(cum for cum, _, name in rows if name == 'backend.main')
+        if best is None or total < best[0]: best = (total, rows)
+    total, rows = best
+    # an indent of 3 marks modules imported directly by backend.main
+    top = sorted(((cum, name) for cum, indent, name in rows if indent == 3), reverse=True)[:10]
+    return {'import_ms': total / 1e3, 'top_imports_ms': {name: cum / 1e3 for cum, name in top}}
+
+WORKDIR = tempfile.mkdtemp(prefix='jobsync-startup-')  # fresh database, caches and vector store
+
+def _env():
+    return dict(os.environ, WARMUP_ON_STARTUP='0', PYTHONPATH=ROOT, JOBSYNC_DB_PATH=os.path.join(WORKDIR, 'data.db'),
+                EMBED_CACHE_PATH=os.path.join(WORKDIR, 'embeddings.sqlite'))
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0)); return s.getsockname()[1]
+
+def _request(url, method='GET', timeout=60):
+    req = urllib.request.Request(url, method=method, data=b'' if method == 'POST' else None)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as r: return r.status
+    except urllib.error.HTTPError as e: return e.code
+
+def serve_times(timeout=120):
+    port = _free_port(); base = f'http://127.0.0.1:{port}'
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'backend.main:app', '--port', str(port), '--log-level', 'warning'],
+                            cwd=WORKDIR, env=_env())
+    try:
+        while True:
+            if proc.poll() is not None: raise RuntimeError('uvicorn exited during startup')
+            if time.perf_counter() - t0 > timeout: raise RuntimeError('server did not answer /healthz in time')
+            try:
+                if _request(base + '/healthz', timeout=1) == 200: break
+            except OSError: time.sleep(0.02)
+        first = time.perf_counter() - t0
+        t = time.perf_counter(); warm_status = _request(base + '/warmup', 'POST', timeout); warm = time.perf_counter() - t
+        ready = _request(base + '/readyz')
+        return {'first_response_ms': first * 1e3, 'warmup_ms': warm * 1e3, 'warmup_status': warm_status, 'ready_status': ready}
+    finally:
+        proc.terminate(); proc.wait(10)
+
+def compare(current, baseline, tolerance):
+    failed = []
+    for key in ('import_ms', 'first_response_ms', 'warmup_ms'):
+        if key in baseline and current[key] > baseline[key] * (1 + tolerance): failed.append(f'{key}: {baseline[key]:.1f} -> {current[key]:.1f}')
+    return failed
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--runs', type=int, default=3); ap.add_argument('--save'); ap.add_argument('--compare')
+    ap.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown for --compare')
+    args = ap.parse_args()
+    res = import_times(args.runs); res.update(serve_times())
+    print(f"import backend.main   {res['import_ms']:8.1f} ms")
+    for name, ms in res['top_imports_ms'].items(): print(f'  {name:<28}{ms:8.1f} ms')
+    print(f"first response        {res['first_response_ms']:8.1f} ms")
+    print(f"POST /warmup          {res['warmup_ms']:8.1f} ms (status {res['warmup_status']}, /readyz {res['ready_status']})")
+    if args.save:
+        with open(args.save, 'w') as f: json.dump(res, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f: failed = compare(res, json.load(f), args.tolerance)
+        for line in failed: print('REGRESSION', line)
+        if failed: sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Microbenchmarks of the scoring/parsing/embedding/vector-store hot paths plus an
+in-process load test of the API, with p50/p95/p99 latency and throughput.
+
+    python -m benchmarks.suite                                  # print results
+    python -m benchmarks.suite --save benchmarks/baseline.json  # record a baseline
+    python -m benchmarks.suite --compare benchmarks/baseline.json --tolerance 0.3
+
+Everything runs against a throwaway database, embedding cache and vector store
+in a temp directory, with LLM feedback disabled. --compare exits non-zero when a
+benchmark's p50 or p95 grows by more than --tolerance relative to the baseline.
+Baselines are only comparable on the same machine.
+"""
+import argparse, asyncio, json, os, sys, tempfile, time
+WORKDIR = tempfile.mkdtemp(prefix='jobsync-bench-')
+# must be set before the backend modules read them at import time
+os.environ.update(JOBSYNC_DB_PATH=os.path.join(WORKDIR, 'data.db'), EMBED_CACHE_PATH=os.path.join(WORKDIR, 'embeddings.sqlite'),
+                  LLM_CACHE_PATH='', WARMUP_ON_STARTUP='0')
+os.environ.pop('OPENAI_API_KEY', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+from benchmarks.corpus import generate, render
+
+def summarize(latencies, wall=None):
+    """p50/p95/p99/mean in ms; throughput is calls per second of wall time (sum of latencies if serial)."""
+    a = np.asarray(latencies) * 1e3; wall = wall if wall is not None else a.sum() / 1e3
+    return {'n': len(a), 'p50_ms': float(np.percentile(a, 50)), 'p95_ms': float(np.percentile(a, 95)),
+            'p99_ms': float(np.percentile(a, 99)), 'mean_ms': float(a.mean()), 'throughput_per_s': len(a) / wall if wall else 0.0}
+
+def timeit(fn, inputs, warmup=2):
+    for x in inputs[:warmup]: fn(x)
+    out = []
+    for x in inputs:
+        t = time.perf_counter(); fn(x); out.append(time.perf_counter() - t)
+    return summarize(out)
+
+class _Upload:
+    def __init__(self, data, name, ctype): self.data, self.name, self.type = data, name, ctype
+    def read(self): return self.data
+
+def micro(corpus):
+    from backend.parsers import extract_text
+    from backend.scoring import hard_match_score, semantic_score, compile_job_profile, embed_resume
+    from embeddings import get_embedding
+    from vectorstore import SimpleVectorStore
+    resumes = [r['text'] for r in corpus['resumes']]; jds = [j['text'] for j in corpus['jds']]
+    pairs = [(r, jds[i % len(jds)]) for i, r in enumerate(resumes)]
+    res = {}
+    for fmt in ('txt', 'pdf', 'docx'):
+        files = [render(t, fmt) for t in resumes]
+        res[f'extract_text[{fmt}]'] = timeit(lambda f: extract_text(_Upload(f[0], 'resume' + f[1], f[2])), files)
+    res['hard_match_score'] = timeit(lambda p: hard_match_score(*p), pairs)
+    res['get_embedding[miss]'] = timeit(get_embedding, [f'{t}\n#{i}' for i, t in enumerate(resumes)], warmup=0)
+    for t in resumes: get_embedding(t)
+    res['get_embedding[hit]'] = timeit(get_embedding, resumes)
+    # as the API calls it: compiled job profile, resume chunks embedded beforehand
+    profiles = [compile_job_profile(j) for j in jds]
+    chunks = [embed_resume(t)[1] for t in resumes]
+    res['embed_resume[hit]'] = timeit(embed_resume, resumes)
+    res['semantic_score'] = timeit(lambda i: semantic_score(resumes[i], None, profiles[i % len(jds)], chunks[i]), list(range(len(resumes))))
+    store = SimpleVectorStore(path=os.path.join(WORKDIR, 'bench_store'), background_compaction=False)
+    vecs = np.random.default_rng(0).standard_normal((max(2000, len(resumes)), 384)).astype(np.float32)
+    res['store.add'] = timeit(lambda i: store.add(vecs[i], {'i': int(i), 'group': int(i % 10)}), list(range(len(vecs))), warmup=0)
+    store.flush()
+    res['store.search'] = timeit(lambda i: store.search(vecs[i], top_k=10), list(range(0, len(vecs), 4)))
+    res['store.search[filtered]'] = timeit(lambda i: store.search(vecs[i], top_k=10, where={'group': 3}), list(range(0, len(vecs), 4)))
+    store.close()
+    return res
+
+async def _load(app, corpus, clients, requests):
+    import httpx
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as c:
+        jobs = []
+        for jd in corpus['jds']:
+            r = await c.post('/jobs', data={'title': jd['title'], 'location': jd['location']}, files={'jd_file': ('jd.txt', jd['text'].encode(), 'text/plain')})
+            jobs.append(r.json()['job_id'])
+        sem = asyncio.Semaphore(clients)
+        async def call(method, url, **kw):
+            async with sem:
+                t = time.perf_counter(); r = await c.request(method, url, **kw); dt = time.perf_counter() - t
+            r.raise_for_status(); return dt, r
+        async def scenario(name, make_calls):
+            t = time.perf_counter(); done = await asyncio.gather(*make_calls())
+            return name, summarize([d for d, _ in done], time.perf_counter() - t), [r for _, r in done]
+        resumes = corpus['resumes'][:requests]
+        name, up, rs = await scenario('POST /resumes', lambda: [call('POST', '/resumes', data={'name': r['name'], 'email': r['email'], 'location': r['location']},
+                                                                       files={'file': ('r.txt', r['text'].encode(), 'text/plain')}) for r in resumes])
+        res = {name: up}; ids = [r.json()['resume_id'] for r in rs]
+        name, res[name], _ = await scenario('POST /evaluate_sync', lambda: [call('POST', '/evaluate_sync', data={'resume_id': rid, 'job_id': jobs[i % len(jobs)]}) for i, rid in enumerate(ids)])
+        name, res[name], _ = await scenario('GET /evaluations/{job_id}', lambda: [call('GET', f'/evaluations/{jobs[i % len(jobs)]}', params={'limit': 50}) for i in range(requests)])
+        name, res[name], _ = await scenario('GET /search_from_job/{job_id}', lambda: [call('GET', f'/search_from_job/{jobs[i % len(jobs)]}') for i in range(requests)])
+        return res
+
+def load(corpus, clients, requests):
+    cwd = os.getcwd(); os.chdir(WORKDIR)  # the API keeps its vector store relative to the working directory
+    try:
+        from backend.main import app
+        return asyncio.run(_load(app, corpus, clients, requests))
+    finally:
+        os.chdir(cwd)
+
+def compare(current, baseline, tolerance, min_delta_ms=0.05):
+    # min_delta_ms keeps microsecond-scale benchmarks from flagging timer noise
+    failed = []
+    for name, b in baseline.items():
+        c = current.get(name)
+        if c is None: continue
+        for key in ('p50_ms', 'p95_ms'):
+            if c[key] > b[key] * (1 + tolerance) and c[key] - b[key] > min_delta_ms: failed.append(f'{name} {key}: {b[key]:.3f} -> {c[key]:.3f}')
+    return failed
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--resumes', type=int, default=200); ap.add_argument('--jds', type=int, default=5)
+    ap.add_argument('--words', type=int, default=300); ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--clients', type=int, default=16, help='concurrent API clients'); ap.add_argument('--requests', type=int, default=200)
+    ap.add_argument('--skip-load', action='store_true'); ap.add_argument('--save'); ap.add_argument('--compare')
+    ap.add_argument('--tolerance', type=float, default=0.3); ap.add_argument('--min-delta-ms', type=float, default=0.05)
+    args = ap.parse_args()
+    corpus = generate(max(args.resumes, args.requests), args.jds, args.words, args.seed)
+    micro_corpus = dict(corpus, resumes=corpus['resumes'][:args.resumes])
+    results = micro(micro_corpus)
+    if not args.skip_load: results.update(load(corpus, args.clients, args.requests))
+    print(f"{'benchmark':<32}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>11}")
+    for name, r in results.items():
+        print(f"{name:<32}{r['n']:>6}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['throughput_per_s']:>11.1f}")
+    if args.save:
+        with open(args.save, 'w') as f: json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f: failed = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        for line in failed: print('REGRESSION', line)
+        if failed: sys.exit(1)
+
+if __name__ == '__main__':
+    main()
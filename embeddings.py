@@ -1,14 +1,98 @@
+import os, sqlite3, threading, hashlib, collections
 import numpy as np
-MODEL=None; EMB_DIM=384
-try:
-    from sentence_transformers import SentenceTransformer
-    MODEL = SentenceTransformer('all-MiniLM-L6-v2'); EMB_DIM=MODEL.get_sentence_embedding_dimension()
-except Exception:
-    MODEL=None
-def get_embedding(text):
-    if MODEL: return MODEL.encode(text, convert_to_numpy=True).astype(float)
-    import numpy as np, hashlib
+from metrics import stage, CACHE_LOOKUPS
+MODEL=None; EMB_DIM=384; MODEL_NAME='all-MiniLM-L6-v2'
+_MODEL_LOADED=False; _MODEL_LOCK=threading.Lock()
+def get_model():
+    """The SentenceTransformer, loaded on first use; None when unavailable (hash fallback)."""
+    global MODEL, EMB_DIM, _MODEL_LOADED
+    if not _MODEL_LOADED:
+        with _MODEL_LOCK:
+            if not _MODEL_LOADED:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    MODEL = SentenceTransformer(MODEL_NAME); EMB_DIM=MODEL.get_sentence_embedding_dimension()
+                except Exception:
+                    MODEL=None
+                _MODEL_LOADED=True
+    return MODEL
+def model_status():
+    if not _MODEL_LOADED: return 'not_loaded'
+    return 'loaded' if MODEL is not None else 'fallback'
+CACHE_PATH=os.getenv('EMBED_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'embeddings.sqlite'))
+CACHE_SIZE=int(os.getenv('EMBED_CACHE_SIZE', '4096'))
+
+class EmbeddingCache:
+    """Content-addressed embedding cache: a bounded in-memory LRU in front of a
+    SQLite table. Keys are sha256(model name + text), so switching models never
+    serves stale vectors. Set ``path`` to '' to keep the cache in memory only."""
+    def __init__(self, path=CACHE_PATH, max_items=CACHE_SIZE):
+        self.max_items=max_items; self.lock=threading.Lock(); self.lru=collections.OrderedDict()
+        self.hits=0; self.disk_hits=0; self.misses=0; self.conn=None
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            # shared by every worker process: WAL lets readers run beside a writer, busy_timeout waits out the other writers
+            self.conn=sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self.conn.execute("PRAGMA journal_mode=WAL"); self.conn.execute("PRAGMA synchronous=NORMAL"); self.conn.execute("PRAGMA busy_timeout=30000")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT, vec BLOB)")
+            self.conn.commit()
+    @staticmethod
+    def key(text, model_name):
+        return hashlib.sha256((model_name+'\0'+text).encode('utf-8')).hexdigest()
+    def get(self, key):
+        with self.lock:
+            vec=self.lru.get(key)
+            if vec is not None:
+                self.lru.move_to_end(key); self.hits+=1; CACHE_LOOKUPS.inc(cache='embedding', result='memory_hit'); return vec
+            row=self.conn.execute("SELECT vec FROM embeddings WHERE key=?", (key,)).fetchone() if self.conn else None
+            if row is None:
+                self.misses+=1; CACHE_LOOKUPS.inc(cache='embedding', result='miss'); return None
+            vec=np.frombuffer(row[0], dtype=np.float32); self.disk_hits+=1; CACHE_LOOKUPS.inc(cache='embedding', result='disk_hit'); self._remember(key, vec); return vec
+    def put(self, key, vec, model_name): return self.put_many([key], [vec], model_name)[0]
+    def put_many(self, keys, vecs, model_name):
+        """Store vectors under their keys in one transaction; returns them as float32."""
+        vecs=[np.asarray(v, dtype=np.float32) for v in vecs]
+        with self.lock:
+            for key, vec in zip(keys, vecs): self._remember(key, vec)
+            if self.conn:
+                with self.conn: self.conn.executemany("INSERT OR REPLACE INTO embeddings (key,model,vec) VALUES (?,?,?)", [(k, model_name, v.tobytes()) for k, v in zip(keys, vecs)])
+        return vecs
+    def _remember(self, key, vec):
+        self.lru[key]=vec; self.lru.move_to_end(key)
+        while len(self.lru)>self.max_items: self.lru.popitem(last=False)
+    def stats(self):
+        with self.lock:
+            lookups=self.hits+self.disk_hits+self.misses
+            return {'memory_hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses, 'size': len(self.lru),
+                    'hit_rate': (self.hits+self.disk_hits)/lookups if lookups else 0.0}
+
+CACHE=EmbeddingCache()
+def _encode(text):
+    model=get_model()
+    if model:
+        with stage('embed_encode'): return model.encode(text, convert_to_numpy=True)
     h = int(hashlib.sha256(text.encode('utf-8')).hexdigest(),16) % (10**8)
-    rng = np.random.RandomState(h); return rng.rand(EMB_DIM).astype(float)
+    rng = np.random.RandomState(h); return rng.rand(EMB_DIM)
+def get_embedding(text):
+    model_name=MODEL_NAME if get_model() else 'hash-fallback'
+    key=CACHE.key(text, model_name); vec=CACHE.get(key)
+    if vec is None: vec=CACHE.put(key, _encode(text), model_name)
+    return vec.astype(float)
+def get_embeddings(texts, batch_size=32):
+    """Embed a list of texts; cache misses are encoded in one MODEL.encode batch.
+    Returns a (len(texts), EMB_DIM) array."""
+    model=get_model(); model_name=MODEL_NAME if model else 'hash-fallback'
+    keys=[CACHE.key(t, model_name) for t in texts]; out=[CACHE.get(k) for k in keys]
+    todo={}
+    for i,v in enumerate(out):
+        if v is None: todo.setdefault(keys[i], []).append(i)
+    if todo:
+        first=[idx[0] for idx in todo.values()]
+        with stage('embed_encode'):
+            if model: encoded=model.encode([texts[i] for i in first], batch_size=batch_size, convert_to_numpy=True)
+            else: encoded=[_encode(texts[i]) for i in first]
+        for idx, vec in zip(todo.values(), CACHE.put_many(list(todo), encoded, model_name)):
+            for i in idx: out[i]=vec
+    return np.vstack(out).astype(float) if out else np.zeros((0, EMB_DIM))
 def cosine_similarity(a,b):
     a=a/(np.linalg.norm(a)+1e-12); b=b/(np.linalg.norm(b)+1e-12); return float(a.dot(b))
@@ -1,25 +1,50 @@
 # llm_feedback.py
 import os
+import json
+import time
+import asyncio
+import hashlib
 import logging
+import sqlite3
+import threading
+import concurrent.futures
 from typing import List, Optional
+from metrics import stage, LLM_CALLS
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-# New OpenAI client for openai>=1.0.0
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-except Exception:
-    OpenAI = None
-    OPENAI_AVAILABLE = False
+# Async OpenAI client for openai>=1.0.0. The SDK is slow to import, so it is only
+# loaded the first time feedback is actually requested with a key configured.
+AsyncOpenAI = None
+OPENAI_AVAILABLE = None  # unknown until _load_openai() runs
+
+def _load_openai():
+    global AsyncOpenAI, OPENAI_AVAILABLE
+    if OPENAI_AVAILABLE is None:
+        try:
+            from openai import AsyncOpenAI
+            OPENAI_AVAILABLE = True
+        except Exception:
+            AsyncOpenAI = None
+            OPENAI_AVAILABLE = False
+    return OPENAI_AVAILABLE
 
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")  # can be None
+# Point at any chat-completions compatible server, e.g. a local stand-in for tests.
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))  # completions in flight at once
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "15"))    # per completion, waiting for a slot included
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "llm_feedback.sqlite"))
+SNIPPET_CHARS = 1500
 
-def _build_prompt(resume_text: str, jd_text: str, missing_skills: list) -> str:
+def _snippets(resume_text: str, jd_text: str):
     # Keep prompt concise (avoid sending huge text). Send first N chars of resume/jd.
-    resume_snippet = (resume_text or "")[:1500]
-    jd_snippet = (jd_text or "")[:1500]
+    return (resume_text or "")[:SNIPPET_CHARS], (jd_text or "")[:SNIPPET_CHARS]
+
+def _build_prompt(resume_text: str, jd_text: str, missing_skills: list) -> str:
+    resume_snippet, jd_snippet = _snippets(resume_text, jd_text)
     missing = ", ".join(missing_skills) if missing_skills else "None"
     prompt = (
         "You are a concise, practical career coach. "
@@ -33,82 +58,219 @@ def _build_prompt(resume_text: str, jd_text: str, missing_skills: list) -> str:
     )
     return prompt
 
+def _parse_bullets(text: str) -> Optional[List[str]]:
+    # Normalize into bullet lines
+    lines = []
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        # strip leading bullet markers (-, *, •, or numbering)
+        if line[0] in ("-", "*", "•"):
+            line = line[1:].strip()
+        # remove leading numbers like "1. " or "1) "
+        if len(line) > 2 and line[0].isdigit() and line[1] in (".", ")"):
+            line = line[2:].strip()
+        lines.append(line)
+    # dedupe and limit
+    seen = set()
+    out = []
+    for l in lines:
+        if l.lower() in seen:
+            continue
+        seen.add(l.lower())
+        out.append(l)
+        if len(out) >= 8:
+            break
+    return out if out else None
+
+def feedback_key(resume_text: str, jd_text: str, missing_skills: list, model: str = LLM_MODEL) -> str:
+    """Cache key: the prompt only depends on the two snippets and the missing-skill set."""
+    resume_snippet, jd_snippet = _snippets(resume_text, jd_text)
+    parts = [model, resume_snippet, jd_snippet, "\n".join(sorted(set(missing_skills or [])))]
+    return hashlib.sha256("\0".join(hashlib.sha256(p.encode("utf-8")).hexdigest() for p in parts).encode("ascii")).hexdigest()
+
+class FeedbackCache:
+    """Persistent LLM feedback, keyed by feedback_key(). Set ``path`` to '' to keep it in memory only."""
+    def __init__(self, path: str = LLM_CACHE_PATH):
+        self.lock = threading.Lock()
+        self.memory = {}
+        self.conn = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # shared with the other API workers: WAL lets readers run beside a writer, busy_timeout waits out the other writers
+            self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA busy_timeout=30000")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS feedback (key TEXT PRIMARY KEY, model TEXT, lines TEXT, created_at REAL)")
+            self.conn.commit()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        with self.lock:
+            if key in self.memory:
+                return self.memory[key]
+            row = self.conn.execute("SELECT lines FROM feedback WHERE key=?", (key,)).fetchone() if self.conn else None
+            if row is None:
+                return None
+            self.memory[key] = lines = json.loads(row[0])
+            return lines
+
+    def put(self, key: str, lines: List[str], model: str):
+        with self.lock:
+            self.memory[key] = lines
+            if self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO feedback (key, model, lines, created_at) VALUES (?,?,?,?)",
+                                  (key, model, json.dumps(lines), time.time()))
+                self.conn.commit()
+
+class _LLMRunner:
+    """Owns one event loop thread, the pooled AsyncOpenAI client and the concurrency semaphore.
+
+    Sync callers submit coroutines with run_coroutine_threadsafe and get a
+    concurrent.futures.Future back, so the HTTP connection pool is shared by
+    every request thread and task worker in the process.
+    """
+    def __init__(self, concurrency: int = LLM_CONCURRENCY, timeout: float = LLM_TIMEOUT_S):
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.client = None
+        self.stats = {"calls": 0, "cache_hits": 0, "failures": 0, "timeouts": 0, "in_flight": 0, "max_in_flight": 0}
+        threading.Thread(target=self.loop.run_forever, name="llm-loop", daemon=True).start()
+
+    async def _complete(self, prompt: str, model: str, max_tokens: int) -> Optional[List[str]]:
+        if self.client is None:
+            # created on the loop thread; no retries and a timeout past ours, so the deadline in _feedback is the whole budget
+            self.client = AsyncOpenAI(api_key=OPENAI_KEY, base_url=OPENAI_BASE_URL, timeout=self.timeout + 1.0, max_retries=0)
+        async with self.semaphore:
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+            try:
+                resp = await self.client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": "You are a helpful career coach who writes concise actionable feedback."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=max_tokens,
+                    temperature=0.2
+                )
+            finally:
+                self.stats["in_flight"] -= 1
+        text = resp.choices[0].message.content if resp.choices else ""
+        if not text:
+            logger.info("LLM returned empty text.")
+            return None
+        return _parse_bullets(text)
+
+    async def _feedback(self, key, prompt, model, max_tokens):
+        self.stats["calls"] += 1
+        try:
+            # one deadline over the wait for a semaphore slot and the call: a request that
+            # queued past it is dropped before it reaches the API
+            lines = await asyncio.wait_for(self._complete(prompt, model, max_tokens), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            LLM_CALLS.inc(outcome="timeout")
+            logger.warning("LLM call timed out after %.1fs", self.timeout)
+            return None
+        except Exception:
+            self.stats["failures"] += 1
+            LLM_CALLS.inc(outcome="error")
+            logger.exception("LLM call failed")
+            return None
+        LLM_CALLS.inc(outcome="ok" if lines else "empty")
+        if lines:
+            try:
+                CACHE.put(key, lines, model)
+            except Exception:  # a locked or full cache must not discard a completed call
+                logger.exception("could not cache LLM feedback")
+        return lines
+
+    def submit(self, key, prompt, model, max_tokens) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(self._feedback(key, prompt, model, max_tokens), self.loop)
+
+CACHE = FeedbackCache()
+_RUNNER = None
+_RUNNER_LOCK = threading.Lock()
+
+def _runner() -> _LLMRunner:
+    global _RUNNER
+    with _RUNNER_LOCK:
+        if _RUNNER is None:
+            _RUNNER = _LLMRunner()
+        return _RUNNER
+
+def llm_enabled() -> bool:
+    if not OPENAI_KEY:
+        return False
+    return bool(_load_openai())
+
+def cached_feedback(resume_text: str, jd_text: str, missing_skills: list, model: str = LLM_MODEL) -> Optional[List[str]]:
+    return CACHE.get(feedback_key(resume_text, jd_text, missing_skills, model))
+
+def request_feedback(
+    resume_text: str,
+    jd_text: str,
+    missing_skills: list,
+    matched_skills: list,
+    max_tokens: int = 256,
+    model: str = LLM_MODEL
+) -> Optional[concurrent.futures.Future]:
+    """
+    Start (or reuse from cache) LLM feedback without waiting for it.
+    Returns a Future resolving to a list of bullet strings or None, or None when the LLM is not configured.
+    """
+    if not llm_enabled():
+        LLM_CALLS.inc(outcome="disabled")
+        return None
+    key = feedback_key(resume_text, jd_text, missing_skills, model)
+    lines = CACHE.get(key)
+    if lines is not None:
+        if _RUNNER is not None:
+            _RUNNER.stats["cache_hits"] += 1
+        LLM_CALLS.inc(outcome="cache_hit")
+        fut = concurrent.futures.Future()
+        fut.set_result(lines)
+        return fut
+    return _runner().submit(key, _build_prompt(resume_text, jd_text, missing_skills), model, max_tokens)
+
+async def agenerate_feedback_with_llm(resume_text: str, jd_text: str, missing_skills: list, matched_skills: list, **kwargs) -> Optional[List[str]]:
+    """Awaitable form of generate_feedback_with_llm for async handlers."""
+    fut = request_feedback(resume_text, jd_text, missing_skills, matched_skills, **kwargs)
+    return await asyncio.wrap_future(fut) if fut is not None else None
+
 def generate_feedback_with_llm(
     resume_text: str,
     jd_text: str,
     missing_skills: list,
     matched_skills: list,
     max_tokens: int = 256,
-    model: str = "gpt-3.5-turbo"
+    model: str = LLM_MODEL
 ) -> Optional[List[str]]:
     """
-    Call OpenAI Chat Completions using the new OpenAI client (>=1.0).
-    Returns: list of feedback bullet strings, or None if unable to call LLM.
+    Blocking wrapper: returns a list of feedback bullet strings, or None if unable to call the LLM
+    (not configured, failed, or slower than LLM_TIMEOUT_S). Results are cached persistently.
     """
     if not OPENAI_KEY:
         logger.info("OPENAI_API_KEY not set; skipping LLM feedback.")
+        LLM_CALLS.inc(outcome="disabled")
         return None
-    if not OPENAI_AVAILABLE or OpenAI is None:
+    if not _load_openai():
         logger.info("OpenAI SDK not available; skipping LLM feedback.")
+        LLM_CALLS.inc(outcome="disabled")
         return None
-
-    try:
-        client = OpenAI(api_key=OPENAI_KEY)
-    except TypeError:
-        # Some OpenAI builds take no api_key argument and rely on env var
-        client = OpenAI()
-
-    prompt = _build_prompt(resume_text, jd_text, missing_skills)
-
-    try:
-        # Create a chat completion
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are a helpful career coach who writes concise actionable feedback."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=max_tokens,
-            temperature=0.2
-        )
-        # resp.choices[0].message.content is the text (new SDK)
-        text = ""
+    fut = request_feedback(resume_text, jd_text, missing_skills, matched_skills, max_tokens, model)
+    with stage("llm"):
         try:
-            text = resp.choices[0].message.content
-        except Exception:
-            # Some SDK versions return slightly different shapes; fallback:
-            text = getattr(resp.choices[0], "message", {}).get("content", "") if resp.choices else ""
-
-        if not text:
-            logger.info("LLM returned empty text.")
+            # the runner enforces LLM_TIMEOUT_S itself; the margin only covers scheduling
+            return fut.result(timeout=LLM_TIMEOUT_S + 1.0)
+        except concurrent.futures.TimeoutError:
+            fut.cancel()  # nobody is waiting for it any more: keep it from reaching the API
+            logger.warning("LLM feedback not ready in time; using fallback.")
             return None
 
-        # Normalize into bullet lines
-        lines = []
-        for raw in text.splitlines():
-            line = raw.strip()
-            if not line:
-                continue
-            # strip leading bullet markers (-, *, •, or numbering)
-            if line[0] in ("-", "*", "•"):
-                line = line[1:].strip()
-            # remove leading numbers like "1. " or "1) "
-            if len(line) > 2 and line[0].isdigit() and line[1] in (".", ")"):
-                line = line[2:].strip()
-            lines.append(line)
-        # dedupe and limit
-        seen = set()
-        out = []
-        for l in lines:
-            if l.lower() in seen:
-                continue
-            seen.add(l.lower())
-            out.append(l)
-            if len(out) >= 8:
-                break
-        return out if out else None
-
-    except Exception as ex:
-        logger.exception("LLM call failed")
-        return None
-
+def llm_stats() -> dict:
+    stats = dict(_RUNNER.stats) if _RUNNER is not None else {}
+    stats.update({"enabled": llm_enabled(), "concurrency": LLM_CONCURRENCY, "timeout_s": LLM_TIMEOUT_S})
+    return stats
@@ -0,0 +1,141 @@
+import os, re, sys, copy, time, random, threading, contextvars, collections, logging
+from contextlib import contextmanager
+logger = logging.getLogger(__name__)
+REGISTRY = []
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _Metric:
+    kind = ''
+    def __init__(self, name, help, labelnames=()):
+        self.name = name; self.help = help; self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock(); self.values = {}
+        REGISTRY.append(self)
+    def _key(self, labels): return tuple(str(labels.get(l, '')) for l in self.labelnames)
+    def _labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs: return ''
+        return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs) + '}'
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self.lock: items = sorted(copy.deepcopy(self.values).items())
+        for key, v in items: lines += self._render_one(key, v)
+        return lines
+
+class Counter(_Metric):
+    kind = 'counter'
+    def inc(self, n=1, **labels):
+        k = self._key(labels)
+        with self.lock: self.values[k] = self.values.get(k, 0) + n
+    def _render_one(self, key, v): return [f'{self.name}{self._labels(key)} {v}']
+
+class Gauge(_Metric):
+    """Set directly, or give ``fn`` to compute the value at scrape time."""
+    kind = 'gauge'
+    def __init__(self, name, help, labelnames=(), fn=None):
+        super().__init__(name, help, labelnames); self.fn = fn
+    def set(self, value, **labels):
+        with self.lock: self.values[self._key(labels)] = value
+    def render(self):
+        if self.fn is not None:
+            try: self.set(self.fn())
+            except Exception: logger.debug("gauge %s callback failed", self.name, exc_info=True)
+        return super().render()
+    def _render_one(self, key, v): return [f'{self.name}{self._labels(key)} {v}']
+
+class Histogram(_Metric):
+    kind = 'histogram'
+    def __init__(self, name, help, labelnames=(), buckets=BUCKETS):
+        super().__init__(name, help, labelnames); self.buckets = tuple(buckets)
+    def observe(self, value, **labels):
+        k = self._key(labels)
+        with self.lock:
+            h = self.values.get(k)
+            if h is None: h = self.values[k] = [[0] * len(self.buckets), 0.0, 0]  # cumulative bucket counts, sum, count
+            for i, b in enumerate(self.buckets):
+                if value <= b: h[0][i] += 1
+            h[1] += value; h[2] += 1
+    def _render_one(self, key, h):
+        counts, total, n = h
+        return ([f'{self.name}_bucket{self._labels(key, [("le", b)])} {c}' for b, c in zip(self.buckets, counts)] +
+                [f'{self.name}_bucket{self._labels(key, [("le", "+Inf")])} {n}',
+                 f'{self.name}_sum{self._labels(key)} {total}', f'{self.name}_count{self._labels(key)} {n}'])
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    return '\n'.join(line for m in REGISTRY for line in m.render()) + '\n'
+
+STAGE_SECONDS = Histogram('jobsync_stage_seconds', 'Time spent per processing stage.', ('stage',))
+REQUEST_SECONDS = Histogram('jobsync_request_seconds', 'HTTP request latency.', ('method', 'route', 'status'))
+CACHE_LOOKUPS = Counter('jobsync_cache_lookups_total', 'Cache lookups by cache and result.', ('cache', 'result'))
+LLM_CALLS = Counter('jobsync_llm_calls_total', 'LLM feedback requests by outcome.', ('outcome',))
+LLM_FALLBACKS = Counter('jobsync_llm_fallbacks_total', 'Evaluations that asked for LLM feedback and used the rule-based text.')
+
+# Stage timings of the current request, for the Server-Timing header. Handlers run in
+# threadpool threads with a copy of the request's context, so appends to the shared
+# list are visible to the middleware.
+_REQUEST_TIMINGS = contextvars.ContextVar('jobsync_request_timings', default=None)
+
+def begin_request():
+    timings = []; _REQUEST_TIMINGS.set(timings); return timings
+
+@contextmanager
+def stage(name):
+    """Time a block (or, as a decorator, a function): feeds jobsync_stage_seconds and the
+    current request's Server-Timing."""
+    t = time.perf_counter()
+    try: yield
+    finally:
+        dt = time.perf_counter() - t; STAGE_SECONDS.observe(dt, stage=name)
+        timings = _REQUEST_TIMINGS.get()
+        if timings is not None: timings.append((name, dt))
+
+def server_timing(timings, total=None):
+    agg = collections.OrderedDict()
+    for name, dt in timings: agg[name] = agg.get(name, 0.0) + dt
+    if total is not None: agg['total'] = total
+    return ', '.join(f'{name};dur={1e3 * dt:.2f}' for name, dt in agg.items())
+
+class StackSampler:
+    """Samples every thread's Python stack at ``interval`` seconds and counts
+    collapsed stacks ("outer;...;inner" -> samples), the format flame-graph tools read."""
+    def __init__(self, interval=0.005):
+        self.interval = interval; self.counts = collections.Counter(); self._stop = threading.Event(); self._thread = None
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True); self._thread.start(); return self
+    def stop(self):
+        self._stop.set(); self._thread.join(); return self.counts
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me: continue
+                stack = []
+                while frame is not None:
+                    stack.append(f'{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})'); frame = frame.f_back
+                self.counts[';'.join(reversed(stack))] += 1
+
+# Opt-in: PROFILE_SLOW_MS enables it; PROFILE_SAMPLE_RATE is the share of requests sampled.
+PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', '0'))
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0.1'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'profiles'))
+
+def _write_profile(label, seconds, counts):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = re.sub(r'[^\w.-]+', '_', label).strip('_') or 'root'
+    path = os.path.join(PROFILE_DIR, f'{time.strftime("%Y%m%d-%H%M%S")}-{int(1e3 * seconds)}ms-{name}.folded')
+    with open(path, 'w') as f: f.writelines(f'{stack} {n}\n' for stack, n in counts.most_common())
+    logger.warning("slow request %s took %.0f ms; profile written to %s", label, 1e3 * seconds, path)
+
+SLOW_REQUEST_HOOK = _write_profile  # called with (label, seconds, Counter of collapsed stacks)
+
+def maybe_profile():
+    """A started StackSampler when this request should be profiled, else None."""
+    if PROFILE_SLOW_MS > 0 and random.random() < PROFILE_SAMPLE_RATE: return StackSampler().start()
+    return None
+
+def finish_profile(sampler, label, seconds):
+    if sampler is None: return
+    counts = sampler.stop()
+    if 1e3 * seconds >= PROFILE_SLOW_MS and counts:
+        try: SLOW_REQUEST_HOOK(label, seconds, counts)
+        except Exception: logger.exception("slow request hook failed")
@@ -0,0 +1,39 @@
+"""rescore_job against stored score components: new weights, and evaluations scored
+against a JD text that has since been edited.
+
+    python -m pytest tests
+"""
+import os, sys, tempfile
+import pytest
+CACHE_DIR = tempfile.mkdtemp(prefix='jobsync-test-')
+os.environ.setdefault('EMBED_CACHE_PATH', os.path.join(CACHE_DIR, 'embeddings.sqlite')); os.environ.setdefault('LLM_CACHE_PATH', '')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend import db
+from backend.rescore import rescore_job
+from backend.scoring import jd_hash
+
+JD, EDITED = 'Python and SQL developer', 'Go and Kubernetes engineer'
+def details(hard, sem): return {'hard_matches': ['python'], 'missing_skills': ['sql'], 'breakdown': {'hard_score': hard, 'semantic_score': sem}}
+def profile(jd_text): return {'skills': ['python', 'sql'], 'jd_hash': jd_hash(jd_text)}
+def scores(job_id): return {r['id']: (r['score'], r['verdict']) for r in db.get_score_components(job_id)}
+
+@pytest.fixture
+def job(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'data.db')); db.init_db()
+    job_id = db.add_job('dev', JD); rid = db.add_resume('A', '', 'Pune', 'python developer')
+    db.add_evaluation(rid, job_id, 62.0, 'Medium', details(50.0, 80.0), jd_hash(JD))
+    db.add_evaluation(rid, job_id, 62.0, 'Medium', details(50.0, 80.0))  # from before evaluations kept jd_hash
+    yield job_id
+    db.get_pool().close()
+
+def test_new_weights_update_evaluations_of_the_current_jd(job):
+    out = rescore_job(job, profile(JD), weights=(0.5, 0.5))
+    assert (out['evaluations'], out['updated'], out['stale']) == (1, 1, 1)
+    first, second = sorted(scores(job).items())
+    assert first[1] == (pytest.approx(65.0), 'Medium') and second[1] == (62.0, 'Medium')
+
+def test_an_edited_jd_leaves_its_evaluations_alone(job):
+    before = scores(job); db.update_job(job, jd_text=EDITED)
+    out = rescore_job(job, profile(EDITED), weights=(0.0, 1.0))
+    assert (out['evaluations'], out['updated'], out['stale']) == (0, 0, 2)
+    assert scores(job) == before
@@ -0,0 +1,106 @@
+"""SimpleVectorStore against a reference dict: upserts, deletes, compaction, reopening,
+log replay after a crash, a torn log tail and two writer processes.
+
+    python -m pytest tests
+"""
+import os, sys, time, random, threading, multiprocessing
+import numpy as np
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vectorstore import SimpleVectorStore
+
+D = 16
+def vec(i): return np.random.default_rng(i).standard_normal(D).astype(np.float32)
+def open_store(path, **kw): return SimpleVectorStore(str(path), dim=D, buffer_size=8, merge_factor=2, background_compaction=False, **kw)
+
+def check(store, ref):
+    """The store holds exactly the ids of ``ref`` (id -> vector seed), each findable by its vector."""
+    assert len(store) == len(ref)
+    for id_, seed in ref.items():
+        assert id_ in store
+        meta, score = store.search(vec(seed), top_k=1, where={'_id': [id_]})[0]
+        assert meta == {'id': id_, 'seed': seed} and score == pytest.approx(1.0, abs=1e-5)
+    if ref:
+        ids = [m['id'] for m, _ in store.search(vec(0), top_k=len(ref) + 5)]
+        assert sorted(ids) == sorted(ref)
+
+@pytest.mark.parametrize('kw', [{}, {'dtype': 'int8'}])
+def test_random_operations_match_a_dict(tmp_path, kw):
+    rng = random.Random(0); ref = {}; store = open_store(tmp_path, **kw)
+    for step in range(400):
+        op = rng.random(); id_ = rng.randrange(60)
+        if op < 0.6:
+            seed = step + 1; store.upsert(id_, vec(seed), {'id': id_, 'seed': seed}); ref[id_] = seed
+        elif op < 0.85: assert store.delete(id_) == (ref.pop(id_, None) is not None)
+        elif op < 0.9: store.compact()
+        elif op < 0.95: store.flush()
+        else: store.close(); store = open_store(tmp_path, **kw)
+        if step % 50 == 0: check(store, ref)
+    check(store, ref); store.close()
+    store = open_store(tmp_path, **kw); check(store, ref); store.close()
+
+def _write_and_crash(path, n):
+    store = open_store(path)
+    for i in range(n): store.upsert(i, vec(i + 1), {'id': i, 'seed': i + 1})
+    store.delete(0)
+    os._exit(0)  # no close(): buffered rows exist only in the log
+
+def _fork():
+    return multiprocessing.get_context('fork')
+
+def test_replays_the_log_after_a_crash(tmp_path):
+    p = _fork().Process(target=_write_and_crash, args=(str(tmp_path), 13)); p.start(); p.join()
+    assert p.exitcode == 0
+    store = open_store(tmp_path); check(store, {i: i + 1 for i in range(1, 13)}); store.close()
+
+def test_ignores_a_torn_log_tail(tmp_path):
+    store = open_store(tmp_path)
+    for i in range(5): store.upsert(i, vec(i + 1), {'id': i, 'seed': i + 1})
+    store.close()
+    with open(os.path.join(tmp_path, 'buffer.log'), 'ab') as f: f.write(b'\x80\x04\x95\x40\x00\x00')  # half a record
+    store = open_store(tmp_path); ref = {i: i + 1 for i in range(5)}; check(store, ref)
+    store.upsert(9, vec(10), {'id': 9, 'seed': 10}); ref[9] = 10; store.close()
+    store = open_store(tmp_path); check(store, ref); store.close()
+
+def _writer(path, w, n):
+    store = open_store(path)
+    for i in range(n):
+        id_ = 1000 * w + i if i % 3 else 10 ** 6 + i  # every third id is written by both processes
+        store.upsert(id_, vec(id_), {'id': id_, 'seed': id_})
+        if i % 10 == 9 and (i - 1) % 3: assert store.delete(1000 * w + i - 1)
+    store.close()
+
+def test_two_writer_processes(tmp_path):
+    open_store(tmp_path).close(); n = 120
+    ps = [_fork().Process(target=_writer, args=(str(tmp_path), w, n)) for w in range(2)]
+    for p in ps: p.start()
+    for p in ps: p.join()
+    assert [p.exitcode for p in ps] == [0, 0]
+    ref = {}
+    for w in range(2):
+        for i in range(n):
+            id_ = 1000 * w + i if i % 3 else 10 ** 6 + i; ref[id_] = id_
+            if i % 10 == 9 and (i - 1) % 3: ref.pop(1000 * w + i - 1)
+    store = open_store(tmp_path); check(store, ref); store.compact(); check(store, ref); store.close()
+
+def test_compact_while_a_background_compaction_runs(tmp_path):
+    store = SimpleVectorStore(str(tmp_path), dim=D, buffer_size=8, merge_factor=2); ref = {}
+    live_rows = store._live_rows; started = threading.Event()
+    def slow_live_rows(*a):
+        started.set(); time.sleep(0.2); return live_rows(*a)
+    store._live_rows = slow_live_rows
+    for i in range(64):
+        store.upsert(i, vec(i + 1), {'id': i, 'seed': i + 1}); ref[i] = i + 1
+        if i % 5 == 4: store.delete(i - 2); ref.pop(i - 2)
+        if started.is_set() and store._compactor.is_alive(): break
+    assert store._compactor.is_alive()
+    bg = store._compactor; store.compact()
+    assert not bg.is_alive()
+    for i in range(100, 132): store.upsert(i, vec(i), {'id': i, 'seed': i}); ref[i] = i
+    compactor = store._compactor; store.close()
+    assert compactor is None or not compactor.is_alive()
+    assert not [t for t in threading.enumerate() if 'compact' in t.name and t.is_alive()]
+    store = open_store(tmp_path); check(store, ref)
+    referenced = {f for s in store.segments for f in s.files()}
+    assert sorted(f for f in os.listdir(tmp_path) if f.startswith('seg-') and f not in referenced) == []
+    store.close()
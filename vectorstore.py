@@ -1,31 +1,691 @@
-import os,pickle,threading,numpy as np
+import os, sys, json, time, pickle, argparse, threading, numpy as np
+from contextlib import contextmanager
+from ann import IVFIndex, normalize as _normalize
+from metrics import stage
+try: import fcntl
+except ImportError: fcntl=None; import msvcrt  # Windows
 LOCK=threading.Lock()
+MANIFEST='manifest.json'; BUFFER_LOG='buffer.log'; LOCK_FILE='store.lock'
+PURGE_RATIO=0.25  # a segment with this share of deleted rows is rewritten by the next compaction
+ID, ADDED_AT = '_id', '_added_at'  # built-in columns: the row's id and its unix insert time
+DTYPES=('float32', 'float16', 'int8')  # storage modes of the copy a search scans
+SCAN_BLOCK=4096  # rows of a quantized segment widened to float32 at a time
+
+def quantize(vectors, dtype):
+    """(codes, scales) of float32 rows: float16 codes with no scales, or int8 codes with
+    one float32 scale per row (row = codes * scale)."""
+    v=np.asarray(vectors, dtype=np.float32)
+    if dtype=='float16': return v.astype(np.float16), None
+    scale=np.abs(v).max(axis=1, initial=0.0)/127.0; scale[scale==0]=1.0
+    return np.round(v/scale[:,None]).astype(np.int8), scale.astype(np.float32)
+
+def _column(values):
+    """One metadata key as a typed array (bool, int64, float64 or str) when every value
+    fits the type, else as an object array."""
+    if all(isinstance(v, (bool, np.bool_)) for v in values): return np.asarray(values, dtype=bool)
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in values): return np.asarray(values, dtype=np.int64)
+    if all(isinstance(v, (int, float, np.number)) and not isinstance(v, bool) for v in values): return np.asarray(values, dtype=np.float64)
+    if all(isinstance(v, str) for v in values): return np.asarray(values, dtype=str)
+    out=np.empty(len(values), dtype=object); out[:]=values; return out
+def _to_columns(metas, ids, added_at, keys=None):
+    """Columns for a list of metadata dicts; keys missing from a row read back as None."""
+    if keys is None: keys=list(dict.fromkeys(k for m in metas for k in m))
+    cols={ID: _column(list(ids)), ADDED_AT: np.asarray(added_at, dtype=np.float64)}
+    for k in keys:
+        if k not in cols: cols[k]=_column([m.get(k) for m in metas])
+    return cols
+def _concat_columns(parts, counts, keep):
+    keys=list(dict.fromkeys(k for c in parts for k in c)); out={}
+    for k in keys:
+        arrs=[c[k] if k in c else np.full(n, None, dtype=object) for c, n in zip(parts, counts)]
+        if len({a.dtype.kind for a in arrs})>1: arrs=[a.astype(object) for a in arrs]
+        out[k]=np.concatenate(arrs)[keep]
+    return out
+def _py(v): return v.item() if isinstance(v, np.generic) else v
+def _match(col, cond, n):
+    """Rows of ``col`` matching ``cond``: a (lo, hi) tuple is an inclusive range (None for
+    an open end), a list/set is membership, anything else is equality."""
+    if col is None: return np.zeros(n, dtype=bool)
+    if isinstance(cond, tuple):
+        lo, hi = cond; m=np.ones(n, dtype=bool)
+        if lo is not None: m&=col>=lo
+        if hi is not None: m&=col<=hi
+        return m
+    if isinstance(cond, (list, set, frozenset, np.ndarray)):
+        if col.dtype!=object:
+            try: return np.isin(col, np.asarray(list(cond)))
+            except TypeError: pass
+        vals=set(cond); return np.fromiter((_py(v) in vals for v in col), dtype=bool, count=n)
+    m=col==cond
+    return m if np.ndim(m) else np.full(n, bool(m))
+def _select(cols, n, where, exclude):
+    m=np.ones(n, dtype=bool)
+    for k, cond in (where or {}).items(): m&=_match(cols.get(k), cond, n)
+    for k, cond in (exclude or {}).items():
+        if k in cols: m&=~_match(cols[k], cond, n)
+    return m
+
+def _stat(path):
+    try: st=os.stat(path); return st.st_ino, st.st_mtime_ns, st.st_size
+    except OSError: return None
+def _size(path):
+    try: return os.path.getsize(path)
+    except OSError: return 0
+
+class _FileLock:
+    """Advisory lock on a file, shared by every process that opens the store: fcntl.flock
+    on POSIX, msvcrt.locking on Windows (where ``shared`` is exclusive too)."""
+    def __init__(self, path): self.fd=os.open(path, os.O_RDWR|os.O_CREAT, 0o644)
+    @contextmanager
+    def __call__(self, shared=False):
+        if fcntl: fcntl.flock(self.fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            os.lseek(self.fd, 0, 0)
+            while True:
+                try: msvcrt.locking(self.fd, msvcrt.LK_LOCK, 1); break
+                except OSError: pass  # LK_LOCK gives up after ~10s
+        try: yield
+        finally:
+            if fcntl: fcntl.flock(self.fd, fcntl.LOCK_UN)
+            else: os.lseek(self.fd, 0, 0); msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+    def close(self): os.close(self.fd)
+
+class _Segment:
+    """A sealed, immutable run of vectors. Files are opened lazily: vectors are
+    memory-mapped and the metadata columns are read only when a search needs them.
+    A quantized copy (``quant``), when present, is held in memory and is what
+    ``scores`` scans; the float32 file is then only touched for re-ranking."""
+    def __init__(self, path, vectors, meta, count, normalized=True, assign=None, deleted=(), quant=None):
+        self.path=path; self.vec_file=vectors; self.meta_file=meta; self.count=int(count); self.normalized=normalized
+        self.assign_file=assign; self.deleted=list(deleted); self.quant_file=quant
+        self._vectors=None; self._columns=None; self._assign=None; self._codes=None
+    @property
+    def vectors(self):
+        if self._vectors is None:
+            v=np.load(os.path.join(self.path,self.vec_file), mmap_mode='r')
+            self._vectors=v.reshape(1,-1) if v.ndim==1 else v
+        return self._vectors
+    @property
+    def columns(self):
+        if self._columns is None:
+            fn=os.path.join(self.path,self.meta_file)
+            if fn.endswith('.npz'):
+                with np.load(fn, allow_pickle=True) as z: self._columns={k: z[k] for k in z.files}
+            else:
+                # older segments pickle a list of dicts, or {'meta': [...], 'ids': [...]}
+                with open(fn,'rb') as f: m=pickle.load(f)
+                metas, ids = (m['meta'], m['ids']) if isinstance(m, dict) else (m, [None]*len(m))
+                self._columns=_to_columns(metas, ids, [np.nan]*len(metas))
+        return self._columns
+    @property
+    def ids(self): return self.columns[ID].tolist()
+    def row(self, i): return {k: _py(c[i]) for k, c in self.columns.items() if k not in (ID, ADDED_AT)}
+    @property
+    def meta(self): return [self.row(i) for i in range(self.count)]
+    @property
+    def assign(self):
+        if self._assign is None: self._assign=np.load(os.path.join(self.path,self.assign_file))
+        return self._assign
+    def set_assign(self, name, assign):
+        np.save(os.path.join(self.path,name), np.asarray(assign, dtype=np.int32)); self.assign_file=name; self._assign=None
+    @property
+    def codes(self):
+        """(codes, scales) of the quantized copy; scales is None for float16."""
+        if self._codes is None:
+            with np.load(os.path.join(self.path,self.quant_file)) as z: self._codes=(z['codes'], z['scales'] if 'scales' in z.files else None)
+        return self._codes
+    def set_quant(self, name, codes, scales):
+        arrs={'codes': codes} if scales is None else {'codes': codes, 'scales': scales}
+        np.savez(os.path.join(self.path,name), **arrs); self.quant_file=name; self._codes=None
+    def scores(self, Q, rows=None):
+        """Dot products of ``rows`` (all by default) with the queries ``Q``, from the
+        quantized copy when there is one."""
+        if self.quant_file is None: return (self.vectors if rows is None else self.vectors[rows]).dot(Q.T)
+        codes, scales = self.codes
+        if rows is not None: codes=codes[rows]; scales=scales[rows] if scales is not None else None
+        out=np.empty((codes.shape[0], Q.shape[0]), dtype=np.float32)
+        for i in range(0, codes.shape[0], SCAN_BLOCK): out[i:i+SCAN_BLOCK]=codes[i:i+SCAN_BLOCK].astype(np.float32).dot(Q.T)
+        if scales is not None: out*=scales[:,None]
+        return out
+    def __eq__(self, other): return isinstance(other, _Segment) and other.vec_file==self.vec_file
+    def __hash__(self): return hash(self.vec_file)
+    def files(self): return [self.vec_file, self.meta_file]+[f for f in (self.assign_file, self.quant_file) if f]
+    def to_dict(self, deleted=()):
+        d={'vectors': self.vec_file, 'meta': self.meta_file, 'count': self.count, 'normalized': self.normalized}
+        if self.assign_file: d['assign']=self.assign_file
+        if self.quant_file: d['quant']=self.quant_file
+        if len(deleted): d['deleted']=[int(i) for i in deleted]
+        return d
+
 class SimpleVectorStore:
-    def __init__(self,path='vectorstore', dim=384):
+    """Segmented vector store with optional stable ids.
+
+    Vectors are stored unit-normalized as float32 so a search is a single
+    matrix product. New vectors go to an in-memory write buffer backed by an append-only log
+    (``buffer.log``). Once the buffer holds ``buffer_size`` rows it is sealed into
+    an immutable segment (``seg-N.npy`` + ``seg-N.cols.npz``) and recorded in
+    ``manifest.json``. Sealed segments are memory-mapped, and a background
+    compaction merges runs of ``merge_factor`` similarly sized segments so the
+    segment count stays logarithmic in the store size.
+
+    ``upsert(id, ...)`` replaces the row stored under ``id`` and ``delete(id)``
+    removes it. Both only tombstone the old row: searches skip tombstoned rows,
+    the manifest records them per segment, and compaction drops them (a segment
+    that is ``PURGE_RATIO`` dead is rewritten on its own). Rows added with
+    ``add`` have no id. ``dedupe`` is a one-shot migration for stores written
+    before ids existed.
+
+    Metadata is stored per segment as typed columns, one array per key plus the
+    built-in ``_id`` and ``_added_at`` (unix time). ``search(..., where=...,
+    exclude=...)`` turns conditions on those columns into a row mask before
+    scoring, so only matching rows are scored.
+
+    ``index='ivf'`` (or an ``ann.IVFIndex``) replaces the exact scan with an
+    approximate one once the store holds enough vectors to train it. Each segment
+    then also gets a ``seg-N.ivf-G.npy`` file with its list assignments for the
+    centroids in ``ivf-G.npy``; ``nprobe`` sets the recall/speed trade-off.
+
+    ``dtype='float16'`` or ``'int8'`` (scaled per vector) also writes each segment
+    as ``seg-N.q-<dtype>.npz`` and keeps that in memory instead of relying on the
+    float32 pages: searches scan the compact copy, take ``rerank`` times
+    ``top_k`` candidates and re-score those exactly against the float32 rows,
+    which stay memory-mapped on disk. Opening a store with a different
+    ``dtype`` rewrites the copies. Both save memory, not time: int8 searches
+    about as fast as float32, float16 about 12x slower (numpy has no
+    half-precision matrix product), so use float16 only when memory is all
+    that matters.
+
+    Several processes may open the same store (e.g. uvicorn ``--workers``).
+    Every write takes an exclusive lock on ``store.lock`` and first catches up
+    with the others' writes; files only ever change by appending to the log or
+    by atomically replacing the manifest, whose ``generation`` goes up on every
+    write. Before searching, a reader stats the manifest and the log: when the
+    generation moved it reloads the segment list (segments are immutable and
+    memory-mapped, so that is cheap), otherwise it replays only the log records
+    appended since its last look. All processes must use the same settings.
+    """
+    def __init__(self,path='vectorstore', dim=384, buffer_size=256, merge_factor=4, background_compaction=True, index=None, nlist=64, nprobe=8, dtype='float32', rerank=4):
+        if dtype not in DTYPES: raise ValueError('dtype must be one of %s'%(DTYPES,))
+        self.dtype=dtype; self.rerank=max(1,int(rerank))
         self.path=path; os.makedirs(path, exist_ok=True)
         self.meta_path=os.path.join(path,'meta.pkl'); self.vec_path=os.path.join(path,'vectors.npy')
-        self.dim=dim; self.meta=[]; self.vectors=np.zeros((0,dim), dtype=float); self._load()
+        self.manifest_path=os.path.join(path,MANIFEST); self.log_path=os.path.join(path,BUFFER_LOG)
+        self.dim=dim; self.buffer_size=max(1,int(buffer_size)); self.merge_factor=max(2,int(merge_factor))
+        self.background_compaction=background_compaction
+        self.index=IVFIndex(dim, nlist=nlist, nprobe=nprobe) if index=='ivf' else index
+        self._ivf=None  # {'generation', 'centroids', 'trained_on'} of the persisted index
+        self.segments=[]; self._new_buffer(); self._next_seg=0; self._buf_seq=0
+        self._dead=np.zeros(0, dtype=bool); self._n_dead=0; self._ids=None  # tombstones by position; id -> position, built on demand
+        self.keyed=True  # False for stores written before ids existed, until dedupe() has run
+        self._generation=0; self._manifest_stat=None; self._log_off=0  # what this process has seen on disk
+        self._flock=_FileLock(os.path.join(path,LOCK_FILE))
+        self._compacting=False; self._compactor=None; self._load()
+    def __len__(self): return self._rows()-self._n_dead
+    def _rows(self): return self._sealed_count()+self._buf_n
+    def _new_buffer(self):
+        # a fresh array per seal, so views handed out by _snapshot stay valid
+        self._buf=np.empty((self.buffer_size, self.dim), dtype=np.float32); self._buf_meta=[]; self._buf_ids=[]; self._buf_ts=[]; self._buf_assign=[]; self._buf_n=0
+    def _buffer_append(self, v, meta, id_=None, ts=np.nan):
+        pos=self._rows()
+        self._buf[self._buf_n]=v; self._buf_meta.append(meta); self._buf_ids.append(id_); self._buf_ts.append(ts); self._buf_n+=1
+        if pos>=self._dead.size: self._dead=np.concatenate([self._dead, np.zeros(max(self.buffer_size, self._dead.size), dtype=bool)])
+        if self.index is not None and self.index.is_trained:
+            a=int(self.index.assign(v)[0]); self._buf_assign.append(a); self.index.add(pos, a)
+        return pos
+    def _sealed_count(self): return sum(s.count for s in self.segments)
     def _load(self):
-        if os.path.exists(self.meta_path) and os.path.exists(self.vec_path):
-            import pickle, numpy as np
-            self.meta=pickle.load(open(self.meta_path,'rb'))
-            self.vectors=np.load(self.vec_path)
-            if self.vectors.ndim==1: self.vectors=self.vectors.reshape(1,-1)
-    def add(self, vector, meta):
-        v = np.asarray(vector, dtype=float).reshape(1,-1)
+        with self._flock():  # exclusive: the upgrades below may rewrite files
+            self._read_manifest()
+            self._normalize_segments()
+            self._quantize_segments()
+            self._load_index()
+            self._replay_log()
+        self._log=open(self.log_path,'ab')
+    def _read_manifest(self):
+        """(Re)load segments and tombstones from the manifest, with an empty buffer."""
+        self._manifest_stat=_stat(self.manifest_path); self._log_off=0; self._ids=None
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f: man=json.load(f)
+            self.dim=int(man.get('dim', self.dim)); self._next_seg=int(man.get('next_segment',0)); self._ivf=man.get('ivf')
+            self._buf_seq=int(man.get('buffers',0)); self.keyed=bool(man.get('keyed', False)); self._generation=int(man.get('generation',0))
+            self.segments=[_Segment(self.path, s['vectors'], s['meta'], s['count'], s.get('normalized', False), s.get('assign'), s.get('deleted', ()), s.get('quant')) for s in man.get('segments',[])]
+        elif os.path.exists(self.meta_path) and os.path.exists(self.vec_path):
+            # stores written before segments existed become the first segment as-is
+            legacy=_Segment(self.path, 'vectors.npy', 'meta.pkl', 0, normalized=False); legacy.count=legacy.vectors.shape[0]
+            self.segments=[legacy]; self.keyed=False
+        self._new_buffer()
+        self._load_tombstones()
+    def _sync(self, truncate=True):
+        """Catch up with writes made by other processes: reload the segments when the
+        manifest's generation moved, then replay the log records appended since the
+        last read. Call with LOCK and the file lock held."""
+        st=_stat(self.manifest_path)
+        if st!=self._manifest_stat:
+            with open(self.manifest_path) as f: gen=int(json.load(f).get('generation',0))
+            if gen!=self._generation:
+                old=self._ivf; self._read_manifest()
+                if self.index is not None and self._ivf:
+                    if old is None or old['generation']!=self._ivf['generation'] or not self.index.is_trained:
+                        self.index.load(os.path.join(self.path,self._ivf['centroids'])); self.index.trained_on=self._ivf['trained_on']
+                    self._rebuild_lists()
+            else: self._manifest_stat=st
+        if _size(self.log_path)!=self._log_off: self._replay_log(truncate)
+    def _refresh(self):
+        """Before a read: sync if another process has written since we last looked. Call with LOCK held."""
+        if _stat(self.manifest_path)!=self._manifest_stat or _size(self.log_path)!=self._log_off:
+            with self._flock(shared=True): self._sync(truncate=False)
+    @contextmanager
+    def _writing(self):
+        with LOCK, self._flock():
+            self._sync(); yield
+    def _load_tombstones(self):
+        self._dead=np.zeros(self._sealed_count()+self.buffer_size, dtype=bool); off=0
+        for s in self.segments:
+            self._dead[off+np.asarray(s.deleted, dtype=np.int64)]=True; off+=s.count
+        self._n_dead=int(self._dead.sum())
+    def _replay_log(self, truncate=True):
+        """Apply the log records from ``_log_off`` on. A torn tail is cut off only when
+        ``truncate`` (i.e. under the exclusive lock: no writer can be mid-append)."""
+        if not os.path.exists(self.log_path): return
+        sealed=self._sealed_count(); good=self._log_off
+        with open(self.log_path,'rb') as f:
+            f.seek(good)
+            while True:
+                try: rec=pickle.load(f)
+                except EOFError: break
+                except Exception: break  # torn tail from a crash mid-append
+                good=f.tell()
+                if rec[0]=='add':
+                    # rows of an already sealed buffer (crash between manifest write and log truncation) are skipped
+                    _, seq, id_, v, meta = rec[:5]
+                    if seq==self._buf_seq:
+                        pos=self._buffer_append(_normalize(v), meta, id_, rec[5] if len(rec)>5 else np.nan)
+                        if id_ is not None and self._ids is not None: self._ids[id_]=pos
+                elif rec[0]=='del':
+                    pos=self._log_pos(rec[1], rec[2])
+                    if pos is not None:
+                        self._mark_dead(pos)
+                        if self._ids is not None and self._ids.get(self._id_at(pos))==pos: del self._ids[self._id_at(pos)]
+                else:
+                    pos, v, meta = rec  # written before ids existed
+                    if pos>=sealed: self._buffer_append(_normalize(v), meta)
+        self._log_off=good
+        if truncate and good!=os.path.getsize(self.log_path):
+            with open(self.log_path,'r+b') as f: f.truncate(good)
+    def _log_pos(self, where, i):
+        """Position of row ``i`` of the segment file or buffer sequence ``where`` named in a
+        log record; None once that segment or buffer has been rewritten (its manifest
+        entry already holds the tombstone)."""
+        off=0
+        for s in self.segments:
+            if s.vec_file==where: return off+i
+            off+=s.count
+        return off+i if where==self._buf_seq and i<self._buf_n else None
+    def _normalize_segments(self):
+        # one-time upgrade of float64 segments written by older versions
+        old=[s for s in self.segments if not s.normalized]
+        if not old: return
+        self.segments=[self._write_segment(_normalize(s.vectors), s.columns) if not s.normalized else s for s in self.segments]
+        self._write_manifest(); self._remove_files(old)
+    def _quant_name(self, seg): return None if self.dtype=='float32' else '%s.q-%s.npz'%(seg.vec_file[:-4], self.dtype)
+    def _quantize_segments(self):
+        # segments written without (or with another) quantized copy, e.g. after changing dtype
+        stale=[s for s in self.segments if s.quant_file!=self._quant_name(s)]
+        for s in stale:
+            old=s.quant_file
+            if self._quant_name(s): s.set_quant(self._quant_name(s), *quantize(s.vectors, self.dtype))
+            else: s.quant_file=None; s._codes=None
+            if old:
+                try: os.remove(os.path.join(self.path,old))
+                except OSError: pass
+        if stale: self._write_manifest()
+    def _write_manifest(self):
+        segs=[]; off=0
+        for s in self.segments:
+            segs.append(s.to_dict(np.flatnonzero(self._dead[off:off+s.count]))); off+=s.count
+        self._generation+=1
+        man={'generation': self._generation, 'dim': self.dim, 'next_segment': self._next_seg, 'buffers': self._buf_seq, 'keyed': self.keyed, 'dtype': self.dtype, 'segments': segs}
+        if self._ivf: man['ivf']=self._ivf
+        tmp=self.manifest_path+'.tmp'
+        with open(tmp,'w') as f: json.dump(man, f)
+        os.replace(tmp, self.manifest_path); self._manifest_stat=_stat(self.manifest_path)
+    def _new_segment_name(self):
+        name='seg-%06d'%self._next_seg; self._next_seg+=1; return name
+    def _write_segment(self, vectors, columns, assign=None, name=None):
+        name=name or self._new_segment_name(); seg=_Segment(self.path, name+'.npy', name+'.cols.npz', len(vectors))
+        np.save(os.path.join(self.path,seg.vec_file), np.asarray(vectors, dtype=np.float32))
+        np.savez(os.path.join(self.path,seg.meta_file), **columns)
+        if self._quant_name(seg): seg.set_quant(self._quant_name(seg), *quantize(vectors, self.dtype))
+        if assign is not None: seg.set_assign(self._assign_name(seg), assign)
+        return seg
+    # --- IVF index bookkeeping -------------------------------------------------
+    def _assign_name(self, seg): return '%s.ivf-%d.npy'%(seg.vec_file[:-4], self._ivf['generation'])
+    def _has_current_assign(self, seg): return self._ivf is not None and seg.assign_file==self._assign_name(seg)
+    def _load_index(self):
+        if self.index is None: return
+        if self._ivf and os.path.exists(os.path.join(self.path,self._ivf['centroids'])):
+            self.index.load(os.path.join(self.path,self._ivf['centroids'])); self.index.trained_on=self._ivf['trained_on']
+            self._assign_segments(); self._rebuild_lists()
+        else:
+            self._maybe_train()
+    def _assign_segments(self):
+        stale=[s for s in self.segments if not self._has_current_assign(s)]
+        for s in stale:
+            old=s.assign_file; s.set_assign(self._assign_name(s), self.index.assign(s.vectors))
+            if old:
+                try: os.remove(os.path.join(self.path,old))
+                except OSError: pass
+        if stale: self._write_manifest()
+    def _rebuild_lists(self):
+        parts=[s.assign for s in self.segments]
+        if self._buf_n:
+            self._buf_assign=[int(a) for a in self.index.assign(self._buf[:self._buf_n])]; parts.append(np.asarray(self._buf_assign, dtype=np.int32))
+        self.index.rebuild(np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32))
+    def _maybe_train(self):
+        """Train on first reaching ``min_train`` sealed rows, retrain whenever the store has grown 4x since."""
+        if self.index is None: return
+        n=self._sealed_count()
+        if n<self.index.min_train or (self.index.is_trained and n<4*self.index.trained_on): return
+        self.index.train(np.concatenate([s.vectors for s in self.segments]))
+        old=self._ivf; gen=(old['generation']+1) if old else 0
+        self._ivf={'generation': gen, 'centroids': 'ivf-%d.npy'%gen, 'trained_on': n}
+        self.index.save(os.path.join(self.path,self._ivf['centroids']))
+        self._assign_segments(); self._rebuild_lists()
+        if old:
+            try: os.remove(os.path.join(self.path,old['centroids']))
+            except OSError: pass
+    # --- ids and tombstones ----------------------------------------------------
+    def _id_index(self):
+        """id -> position of its live row, built on first use. Older live rows sharing an
+        id (a crash between an upsert's add and delete records) are tombstoned here."""
+        if self._ids is None:
+            ids={}
+            for pos, id_ in enumerate([i for s in self.segments for i in s.ids]+self._buf_ids):
+                if id_ is None or self._dead[pos]: continue
+                if id_ in ids: self._mark_dead(ids[id_])
+                ids[id_]=pos
+            self._ids=ids
+        return self._ids
+    def _id_at(self, pos):
+        for s in self.segments:
+            if pos<s.count: return _py(s.columns[ID][pos])
+            pos-=s.count
+        return self._buf_ids[pos]
+    def _mark_dead(self, pos):
+        if not self._dead[pos]: self._dead[pos]=True; self._n_dead+=1
+    def _log_delete(self, pos):
+        off=0
+        for s in self.segments:
+            if pos<off+s.count: rec=('del', s.vec_file, pos-off); break
+            off+=s.count
+        else: rec=('del', self._buf_seq, pos-off)
+        pickle.dump(rec, self._log)
+    # ---------------------------------------------------------------------------
+    def _append(self, v, meta, id_):
+        ids=self._id_index() if id_ is not None else None; ts=time.time()
+        pickle.dump(('add', self._buf_seq, id_, v, meta, ts), self._log)
+        pos=self._buffer_append(v, meta, id_, ts)
+        if ids is not None:
+            old=ids.get(id_); ids[id_]=pos
+            if old is not None: self._mark_dead(old); self._log_delete(old)
+        self._log.flush(); self._log_off=self._log.tell()
+        if self._buf_n>=self.buffer_size: self._seal()
+    def _prepare(self, vector):
+        v = _normalize(np.asarray(vector).reshape(1,-1))
         if v.shape[1]!=self.dim: raise ValueError('dim mismatch')
+        return v[0]
+    @stage('store_add')
+    def add(self, vector, meta):
+        v=self._prepare(vector)
+        with self._writing(): self._append(v, meta, None)
+    @stage('store_add')
+    def upsert(self, id, vector, meta):
+        """Store ``vector`` under ``id``, replacing the row previously stored under it."""
+        v=self._prepare(vector)
+        with self._writing(): self._append(v, meta, id)
+    def delete(self, id):
+        """Remove the row stored under ``id``; False if there is none."""
+        with self._writing():
+            pos=self._id_index().pop(id, None)
+            if pos is None: return False
+            self._mark_dead(pos); self._log_delete(pos); self._log.flush(); self._log_off=self._log.tell()
+            return True
+    def __contains__(self, id):
+        with LOCK: self._refresh(); return id in self._id_index()
+    def flush(self):
+        with self._writing():
+            if self._buf_n: self._seal()
+    @stage('store_seal')
+    def _seal(self):
+        trained=self.index is not None and self.index.is_trained
+        seg=self._write_segment(self._buf[:self._buf_n], _to_columns(self._buf_meta, self._buf_ids, self._buf_ts), self._buf_assign if trained else None)
+        self.segments.append(seg); self._buf_seq+=1; self._write_manifest()
+        self._new_buffer()
+        self._log.seek(0); self._log.truncate(); self._log_off=0
+        self._maybe_train()
+        if self._pick_merge() is not None:
+            if self.background_compaction: self._start_compaction()
+            else: self._compact_locked()
+    def _pick_merge(self):
+        """Return (start, end) of the newest run of ``merge_factor`` segments in the same size
+        tier, else of a single segment with at least ``PURGE_RATIO`` of its rows deleted."""
+        def tier(s): return int(np.log(max(1,s.count)/self.buffer_size)/np.log(self.merge_factor)) if s.count>self.buffer_size else 0
+        segs=self.segments; end=len(segs)
+        while end>0:
+            start=end-1
+            while start>0 and tier(segs[start-1])==tier(segs[end-1]): start-=1
+            if end-start>=self.merge_factor: return start, end
+            end=start
+        off=0
+        for i, s in enumerate(segs):
+            if s.count and self._dead[off:off+s.count].sum()>=PURGE_RATIO*s.count: return i, i+1
+            off+=s.count
+        return None
+    def _merged_assign(self, old):
+        if self.index is None or not self.index.is_trained: return None
+        if all(self._has_current_assign(s) for s in old): return np.concatenate([s.assign for s in old])
+        return self.index.assign(np.concatenate([s.vectors for s in old]))
+    def _offset(self, seg):
+        i=self.segments.index(seg); return i, sum(s.count for s in self.segments[:i])
+    def _keep(self, old):
+        """Indices into the concatenation of ``old`` of its rows that are not tombstoned."""
+        _, off=self._offset(old[0]); return np.flatnonzero(~self._dead[off:off+sum(s.count for s in old)])
+    def _live_rows(self, old, keep):
+        return np.concatenate([s.vectors for s in old])[keep], _concat_columns([s.columns for s in old], [s.count for s in old], keep)
+    def _replace(self, old, merged, keep):
+        """Swap ``old`` for ``merged`` (None when nothing survived) and move tombstones,
+        ids and IVF lists to the new positions. Call with LOCK held."""
+        i, off=self._offset(old[0]); n=sum(s.count for s in old); rows=self._rows()
+        # rows deleted while the merge was being written stay deleted in the merged segment
+        still=self._dead[off:off+n][keep]
+        self._dead=np.concatenate([self._dead[:off], still, self._dead[off+n:rows], np.zeros(self.buffer_size, dtype=bool)])
+        self._n_dead=int(self._dead.sum())
+        self.segments[i:i+len(old)]=[merged] if merged is not None else []
+        self._write_manifest()
+        if len(keep)<n:
+            if self._ids is not None:
+                moved=np.full(n, -1, dtype=np.int64); moved[keep]=np.arange(off, off+len(keep))
+                self._ids={k: (p if p<off else int(moved[p-off]) if p<off+n else p-n+len(keep)) for k, p in self._ids.items()}
+            if self.index is not None and self.index.is_trained: self._rebuild_lists()
+    def _start_compaction(self):
+        if self._compacting: return
+        self._compacting=True
+        self._compactor=threading.Thread(target=self._bg_compact, daemon=True); self._compactor.start()
+    def _bg_compact(self):
+        # only the background thread owns the flag: a foreground compact() must not clear it under a running thread
+        try: self._compact()
+        finally: self._compacting=False
+    def compact(self):
+        """Merge segment runs until no tier holds ``merge_factor`` segments, dropping deleted rows."""
+        t=self._compactor
+        if t is not None and t is not threading.current_thread(): t.join()
+        self._compact()
+    def _compact(self):
+        while True:
+            with self._writing():
+                run=self._pick_merge()
+                if run is None: return
+                # the manifest write reserves the name against other processes
+                old=self.segments[run[0]:run[1]]; name=self._new_segment_name(); keep=self._keep(old); self._write_manifest()
+            with stage('store_compact'):
+                try: vecs, cols = self._live_rows(old, keep)
+                except FileNotFoundError: continue  # already merged away by another process
+                merged=self._write_segment(vecs, cols, name=name) if len(keep) else None
+            with self._writing():
+                if any(s not in self.segments for s in old):  # rewritten meanwhile (dedupe, another process)
+                    if merged is not None: self._remove_files([merged])
+                    continue
+                old=[self.segments[self.segments.index(s)] for s in old]  # the current objects if the manifest was reloaded
+                # assignments are taken under the lock: a retrain may have happened meanwhile
+                assign=self._merged_assign(old)
+                if assign is not None and merged is not None: merged.set_assign(self._assign_name(merged), assign[keep])
+                self._replace(old, merged, keep)
+            self._remove_files(old)
+    @stage('store_compact')
+    def _compact_locked(self):
+        while (run:=self._pick_merge()) is not None:
+            old=self.segments[run[0]:run[1]]
+            keep=self._keep(old); assign=self._merged_assign(old)
+            vecs, cols = self._live_rows(old, keep)
+            merged=self._write_segment(vecs, cols, assign[keep] if assign is not None else None) if len(keep) else None
+            self._replace(old, merged, keep); self._remove_files(old)
+    def dedupe(self, key):
+        """One-shot migration for stores written before ids existed: rows without an id
+        get ``key(meta)`` as theirs, only the newest row per id is kept, and the whole
+        store is rewritten as one segment. Returns the number of rows dropped."""
+        with self._writing():
+            rows=self._rows(); old=list(self.segments)
+            ids=[i if i is not None else key(m) for s in old for i, m in zip(s.ids, s.meta)]
+            ids+=[i if i is not None else key(m) for i, m in zip(self._buf_ids, self._buf_meta)]
+            self._ids=None; newest={}
+            for pos, id_ in enumerate(ids):
+                if id_ is None or self._dead[pos]: continue
+                if id_ in newest: self._mark_dead(newest[id_])
+                newest[id_]=pos
+            keep=np.flatnonzero(~self._dead[:rows])
+            parts=[s.columns for s in old]+[_to_columns(self._buf_meta, self._buf_ids, self._buf_ts)]
+            cols=_concat_columns(parts, [s.count for s in old]+[self._buf_n], keep); cols[ID]=_column([ids[i] for i in keep])
+            vecs=np.concatenate([s.vectors for s in old]+[self._buf[:self._buf_n]])[keep]
+            trained=self.index is not None and self.index.is_trained
+            seg=self._write_segment(vecs, cols, self.index.assign(vecs) if trained and len(keep) else None) if len(keep) else None
+            self.segments=[seg] if seg is not None else []; self._buf_seq+=1; self.keyed=True
+            self._dead=np.zeros(len(keep)+self.buffer_size, dtype=bool); self._n_dead=0
+            self._new_buffer(); self._write_manifest()
+            self._log.seek(0); self._log.truncate(); self._log_off=0
+            if trained: self._rebuild_lists()
+            self._remove_files(old)
+            return rows-len(keep)
+    def _remove_files(self, segs):
+        for s in segs:
+            for fn in s.files():
+                try: os.remove(os.path.join(self.path,fn))
+                except OSError: pass  # still mapped on Windows; the file is orphaned, not referenced
+    def _snapshot(self):
+        segs=list(self.segments); n=self._buf_n
+        buf=(self._buf[:n], self._buf_meta[:n], self._buf_ids[:n], self._buf_ts[:n]) if n else None
+        return segs, buf, self._dead[:self._rows()]
+    def _filter_mask(self, segs, buf, where, exclude):
+        keys=list(where or ())+list(exclude or ())
+        parts=[(s.columns, s.count) for s in segs]+([(_to_columns(buf[1], buf[2], buf[3], keys), len(buf[1]))] if buf else [])
+        return np.concatenate([_select(cols, n, where, exclude) for cols, n in parts])
+    def search(self, qvec, top_k=5, nprobe=None, where=None, exclude=None):
+        return self.search_batch(np.asarray(qvec).reshape(1,-1), top_k, nprobe=nprobe, where=where, exclude=exclude)[0]
+    @stage('store_search')
+    def search_batch(self, qmat, top_k=5, nprobe=None, where=None, exclude=None):
+        """Score every query row of ``qmat`` with one matrix multiply per segment.
+        Returns one ``[(meta, score), ...]`` list per query, best first. With a
+        trained index each query only scores the rows in its ``nprobe`` lists.
+
+        ``where``/``exclude`` map column names to conditions (a value, a list or set
+        of values, or an inclusive ``(lo, hi)`` range): only rows matching every
+        ``where`` condition and no ``exclude`` condition are scored, e.g.
+        ``where={'location': 'Pune', '_added_at': (since, None)}, exclude={'_id': seen}``."""
+        Q = _normalize(np.atleast_2d(qmat))
+        try: return self._search(Q, top_k, nprobe, where, exclude)
+        except FileNotFoundError:
+            # another process merged away a segment this search had not opened yet
+            with LOCK: self._manifest_stat=None
+            return self._search(Q, top_k, nprobe, where, exclude)
+    def _search(self, Q, top_k, nprobe, where, exclude):
         with LOCK:
-            self.meta.append(meta)
-            self.vectors = np.vstack([self.vectors, v]) if self.vectors.size else v
-            self._persist()
-    def search(self, qvec, top_k=5):
-        if self.vectors.size==0: return []
-        q = np.asarray(qvec, dtype=float)
-        norms = np.linalg.norm(self.vectors, axis=1, keepdims=True)+1e-12
-        vecs_n = self.vectors / norms; qn = q/(np.linalg.norm(q)+1e-12)
-        sims = vecs_n.dot(qn); idxs = sims.argsort()[::-1][:top_k]
-        return [(self.meta[int(i)], float(sims[int(i)])) for i in idxs]
-    def _persist(self):
-        import pickle, numpy as np
-        with open(self.meta_path,'wb') as f: pickle.dump(self.meta, f)
-        np.save(self.vec_path, self.vectors)
+            self._refresh(); ivf=self.index is not None and self.index.is_trained
+            segs, buf, dead = self._snapshot()
+            # list positions are only meaningful for the segment layout they were taken with
+            cands=[self.index.candidates(q, nprobe) for q in Q] if ivf else None
+        parts=segs+([buf[0]] if buf else [])
+        if not parts or top_k<=0: return [[] for _ in range(Q.shape[0])]
+        offsets=np.cumsum([0]+[s.count for s in segs]+([len(buf[0])] if buf else []))
+        allowed=~dead
+        if where or exclude: allowed&=self._filter_mask(segs, buf, where, exclude)
+        if ivf:
+            out=[]
+            for q, pos in zip(Q, cands):
+                pos=np.sort(pos[pos<offsets[-1]])  # rows added after the snapshot are not visible
+                out.append(self._search_rows(q[None], pos[allowed[pos]], parts, offsets, segs, buf, top_k)[0])
+            return out
+        pos=np.flatnonzero(allowed)
+        if 2*pos.size<offsets[-1]: return self._search_rows(Q, pos, parts, offsets, segs, buf, top_k)
+        # most rows qualify: one product over everything beats gathering the rows first
+        sims=np.concatenate([self._scores(p, Q) for p in parts])
+        if pos.size<offsets[-1]: sims[~allowed]=-np.inf
+        k=min(self._shortlist(top_k), pos.size)
+        if k<sims.shape[0]: cand=np.argpartition(-sims, k-1, axis=0)[:k]
+        else: cand=np.broadcast_to(np.arange(sims.shape[0])[:,None], sims.shape)
+        return [self._rank(Q[j], cand[:,j], sims[cand[:,j],j], parts, offsets, segs, buf, top_k) for j in range(Q.shape[0])]
+    def _search_rows(self, Q, pos, parts, offsets, segs, buf, top_k):
+        """Top-k of each query over the sorted global positions ``pos`` only."""
+        if not pos.size: return [[] for _ in range(Q.shape[0])]
+        part=np.searchsorted(offsets, pos, side='right')-1; sims=np.empty((pos.size, Q.shape[0]), dtype=np.float32)
+        for p in np.unique(part):
+            sel=part==p; sims[sel]=self._scores(parts[p], Q, pos[sel]-offsets[p])
+        k=min(self._shortlist(top_k), pos.size); out=[]
+        for j in range(Q.shape[0]):
+            best=np.argpartition(-sims[:,j], k-1)[:k] if k<pos.size else np.arange(pos.size)
+            out.append(self._rank(Q[j], pos[best], sims[best,j], parts, offsets, segs, buf, top_k))
+        return out
+    @staticmethod
+    def _scores(part, Q, rows=None):
+        if isinstance(part, _Segment): return part.scores(Q, rows)
+        return (part if rows is None else part[rows]).dot(Q.T)
+    def _shortlist(self, top_k): return int(top_k)*(self.rerank if self.dtype!='float32' else 1)
+    def _rank(self, q, idx, sims, parts, offsets, segs, buf, top_k):
+        """The best ``top_k`` of the candidate positions ``idx``, re-scored against the
+        float32 rows first when ``sims`` came from a quantized copy."""
+        if self.dtype!='float32' and any(isinstance(p, _Segment) and p.quant_file for p in parts):
+            part=np.searchsorted(offsets, idx, side='right')-1; sims=np.empty(idx.size, dtype=np.float32)
+            for p in np.unique(part):
+                sel=part==p; v=parts[p].vectors if isinstance(parts[p], _Segment) else parts[p]
+                sims[sel]=v[idx[sel]-offsets[p]].dot(q)
+        order=np.argsort(-sims, kind='stable')[:int(top_k)]
+        return [(self._meta_at(segs, buf, int(idx[i])), float(sims[i])) for i in order]
+    def _meta_at(self, segs, buf, i):
+        for s in segs:
+            if i<s.count: return s.row(i)
+            i-=s.count
+        return buf[1][i]
+    def scan_bytes(self):
+        """Bytes a full scan reads: the quantized copies, or the float32 rows, plus the buffer."""
+        with LOCK: segs=list(self.segments); n=self._buf_n
+        total=n*self.dim*4
+        for s in segs:
+            if s.quant_file: total+=sum(a.nbytes for a in s.codes if a is not None)
+            else: total+=s.count*self.dim*4
+        return total
+    def close(self):
+        # a merge killed at exit would leave its unreferenced segment files behind
+        if self._compactor is not None: self._compactor.join()
+        with LOCK: self._log.close(); self._flock.close()
+
+def main(argv=None):
+    """Convert a store in place, e.g. a pre-segment ``vectors.npy`` + ``meta.pkl`` directory,
+    to another storage dtype:  python -m vectorstore vectorstore_api --dtype int8"""
+    ap=argparse.ArgumentParser(description='Convert a vector store to another storage dtype.')
+    ap.add_argument('path'); ap.add_argument('--dtype', choices=DTYPES, default='int8'); ap.add_argument('--dim', type=int, default=384)
+    args=ap.parse_args(argv)
+    if not os.path.isdir(args.path): sys.exit('no store at %s'%args.path)
+    store=SimpleVectorStore(args.path, dim=args.dim, background_compaction=False, dtype=args.dtype)
+    store.flush(); full=store._rows()*store.dim*4; scan=store.scan_bytes(); store.close()
+    print('%s: %d rows in %d segments, dtype=%s, scan %.1f MiB (float32 %.1f MiB)'%(args.path, len(store), len(store.segments), args.dtype, scan/2**20, full/2**20))
+
+if __name__=='__main__':
+    main()